@@ -48,6 +48,9 @@ def create_timetable(classes,teachers,rooms,timeslots):
              model.Add(sum(timetable[(class_id,room_id,timeslot_id)] for class_id in class_ids for room_id in rooms['room_id'])<=1)
     #Solver
     solver= cp_model.CpSolver()
+    # fixed seed + single worker: the same timetable on every run
+    solver.parameters.random_seed = 42
+    solver.parameters.num_workers = 1
     status= solver.Solve(model)
 
     if status in (cp_model.FEASIBLE, cp_model.OPTIMAL) :
@@ -149,7 +149,11 @@ for i in range(num_courses):
 # Solve
 
 solver = cp_model.CpSolver()
-solver.parameters.max_time_in_seconds = 10.0  # prevent long solving times
+# Reproducible runs: fixed seed, one search worker, and a deterministic time
+# budget (wall-clock limits make the result depend on machine load)
+solver.parameters.random_seed = 42
+solver.parameters.num_workers = 1
+solver.parameters.max_deterministic_time = 10.0  # prevent long solving times
 
 status = solver.Solve(model)
 
@@ -0,0 +1,147 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import versions
+from models import ClassGroup, Room, ScheduleState, Teacher, TimeSlot
+from validate import query_array
+
+# Room, teacher and timeslot usage of a schedule version.
+#
+# The assignments are one (n, 5) int64 array, as in the validator; ids are
+# mapped to dense indices with searchsorted and every figure is a bincount
+# (or a gather) over those indices, so no ORM rows are walked in Python.
+# The assignments always come from the version's own state, never the live
+# table, so a summary can't mix two versions. Versions never change once
+# written, but room capacities, class sizes and names can, so a summary is
+# cached under the version plus the reference revision, which triggers bump
+# on any write to those tables (see migrate.py). A cache hit costs one
+# single-row read; a dashboard polling the live schedule pays for one
+# aggregation per change.
+#
+#   rooms      periods used, occupancy % of all timeslots, seats offered vs
+#              filled, seat waste (capacity - class size) total and per lesson
+#   teachers   periods, load % of all timeslots, days taught, busiest day
+#   timeslots  lessons, rooms in use %, students seated; per slot of the day
+#              averaged over days, with the peak
+
+CACHE_SIZE = 32
+
+_cache: "OrderedDict[Tuple[int, int], Dict[str, object]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _names(db: Session, model) -> Dict[int, str]:
+    return dict(db.execute(select(model.id, model.name)).all())
+
+def _index(ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # dense positions of values in sorted ids
+    return np.searchsorted(ids, values)
+
+def _pct(a: np.ndarray, b) -> np.ndarray:
+    return np.round(100.0 * a / np.maximum(b, 1), 1)
+
+def summarize(assign: np.ndarray, timeslots: np.ndarray, rooms: np.ndarray,
+              class_size: np.ndarray, teacher_ids: np.ndarray) -> Dict[str, object]:
+    # timeslots (id, day, slot), rooms (id, capacity), class_size (id, size),
+    # all sorted by id
+    n_ts, n_rooms = len(timeslots), len(rooms)
+    ts_i = _index(timeslots[:, 0], assign[:, 1])
+    room_i = _index(rooms[:, 0], assign[:, 4])
+    teacher_i = _index(teacher_ids, assign[:, 3])
+    seats = rooms[room_i, 1] if len(assign) else np.zeros(0, dtype=np.int64)
+    size = class_size[_index(class_size[:, 0], assign[:, 0]), 1] if len(assign) else seats
+
+    used = np.bincount(room_i, minlength=n_rooms)
+    offered = np.bincount(room_i, weights=seats, minlength=n_rooms).astype(np.int64)
+    filled = np.bincount(room_i, weights=size, minlength=n_rooms).astype(np.int64)
+    waste = offered - filled
+    rooms_out = [{
+        "room_id": r, "capacity": cap, "periods": u, "occupancy_pct": occ,
+        "seats_offered": o, "seats_filled": f, "fill_pct": fp,
+        "seat_waste": w, "waste_per_lesson": wpl,
+    } for r, cap, u, occ, o, f, fp, w, wpl in zip(
+        rooms[:, 0].tolist(), rooms[:, 1].tolist(), used.tolist(), _pct(used, n_ts).tolist(),
+        offered.tolist(), filled.tolist(), _pct(filled, offered).tolist(), waste.tolist(),
+        np.round(waste / np.maximum(used, 1), 1).tolist())]
+
+    days = np.unique(timeslots[:, 1])
+    day_i = _index(days, timeslots[ts_i, 1]) if len(assign) else ts_i
+    periods = np.bincount(teacher_i, minlength=len(teacher_ids))
+    per_day = np.bincount(teacher_i * len(days) + day_i,
+                          minlength=len(teacher_ids) * len(days)).reshape(len(teacher_ids), len(days))
+    teachers_out = [{
+        "teacher_id": t, "periods": p, "load_pct": load, "days": d, "max_per_day": m,
+    } for t, p, load, d, m in zip(
+        teacher_ids.tolist(), periods.tolist(), _pct(periods, n_ts).tolist(),
+        (per_day > 0).sum(axis=1).tolist(), per_day.max(axis=1, initial=0).tolist())]
+
+    lessons = np.bincount(ts_i, minlength=n_ts)
+    students = np.bincount(ts_i, weights=size, minlength=n_ts).astype(np.int64)
+    timeslots_out = [{
+        "timeslot_id": ts, "day": d, "slot": s, "lessons": n, "rooms_pct": rp, "students": st,
+    } for (ts, d, s), n, rp, st in zip(timeslots.tolist(), lessons.tolist(),
+                                      _pct(lessons, n_rooms).tolist(), students.tolist())]
+
+    # by slot of the day: the same period across the week
+    slots, slot_i = np.unique(timeslots[:, 2], return_inverse=True)
+    slot_lessons = np.bincount(slot_i, weights=lessons, minlength=len(slots))
+    slot_days = np.bincount(slot_i, minlength=len(slots))
+    by_slot = [{"slot": s, "lessons_per_day": round(n, 2), "rooms_pct": rp}
+               for s, n, rp in zip(slots.tolist(), (slot_lessons / np.maximum(slot_days, 1)).tolist(),
+                                   _pct(slot_lessons, slot_days * n_rooms).tolist())]
+    peak = int(np.argmax(lessons)) if n_ts else None
+
+    return {
+        "assignments": len(assign),
+        "summary": {
+            "room_occupancy_pct": float(_pct(len(assign), n_ts * n_rooms)),
+            "fill_pct": float(_pct(filled.sum(), offered.sum())),
+            "seat_waste": int(waste.sum()),
+            "peak_timeslot": timeslots_out[peak] if peak is not None else None,
+            "peak_slot": max(by_slot, key=lambda s: s["lessons_per_day"]) if by_slot else None,
+        },
+        "rooms": rooms_out,
+        "teachers": teachers_out,
+        "timeslots": timeslots_out,
+        "slots": by_slot,
+    }
+
+def analytics(db: Session, version_id: Optional[int] = None) -> Dict[str, object]:
+    # the live schedule (the active version), or any stored version
+    active = versions.active_version(db)  # also makes sure the state row exists
+    if version_id is None:
+        version_id = active.id
+    # read before the tables, so a concurrent edit can only make the cached
+    # summary newer than its key, never older
+    key = (version_id, db.execute(select(ScheduleState.reference_revision)
+                                  .where(ScheduleState.id == 1)).scalar_one())
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    timeslots = query_array(db, select(TimeSlot.id, TimeSlot.day, TimeSlot.slot).order_by(TimeSlot.id), 3)
+    rooms = query_array(db, select(Room.id, Room.capacity).order_by(Room.id), 2)
+    class_size = query_array(db, select(ClassGroup.id, ClassGroup.size).order_by(ClassGroup.id), 2)
+    teacher_ids = query_array(db, select(Teacher.id).order_by(Teacher.id), 1)[:, 0]
+    room_names, teacher_names = _names(db, Room), _names(db, Teacher)
+    state = versions.materialize(db, version_id)  # KeyError for an unknown version
+    db.commit()
+    assign = np.array([(c, ts, *row) for (c, ts), row in state.items()], dtype=np.int64).reshape(-1, 5)
+    out = summarize(assign, timeslots, rooms, class_size, teacher_ids)
+    for r in out["rooms"]:
+        r["name"] = room_names[r["room_id"]]
+    for t in out["teachers"]:
+        t["name"] = teacher_names[t["teacher_id"]]
+    out["version_id"] = version_id
+
+    with _cache_lock:
+        _cache[key] = out
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return out
@@ -1,59 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import FileResponse
+from __future__ import annotations
+from datetime import date
+import json
+from pathlib import Path
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, ConfigDict
-from typing import List, Dict, Any, Optional
+from typing import Dict, List, Optional
+from sqlalchemy import or_
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-
-app = FastAPI(title="Smart Classroom & Timetable Scheduler")
-
-# Test imports one by one
-try:
-    import db
-    print("✓ db.py imported successfully")
-    get_db = db.get_db
-    Base = db.Base 
-    engine = db.engine
-except Exception as e:
-    print(f"✗ Error importing db.py: {e}")
-    raise
-
-try:
-    import models
-    print("✓ models.py imported successfully") 
-    Teacher = models.Teacher
-    Subject = models.Subject
-    TeacherSubject = models.TeacherSubject
-    ClassGroup = models.ClassGroup
-    Room = models.Room
-    TimeSlot = models.TimeSlot
-    SubjectRequirement = models.SubjectRequirement
-    Assignment = models.Assignment
-except Exception as e:
-    print(f"✗ Error importing models.py: {e}")
-    # Don't raise here, so we can continue testing other imports
-
-try:
-    import scheduler
-    print("✓ scheduler.py imported successfully")
-    generate_schedule = scheduler.generate_schedule
-except Exception as e:
-    print(f"✗ Error importing scheduler.py: {e}")
-
-try:
-    import seed
-    print("✓ seed.py imported successfully")
-except Exception as e:
-    print(f"✗ Error importing seed.py: {e}")
-
-# Initialize DB and seed on startup
-@app.on_event("startup")
-def startup():
-    if 'Base' in globals() and 'engine' in globals():
-        Base.metadata.create_all(bind=engine)
-        if 'seed' in globals():
-            seed.run()
+
+import analytics
+import enrollment
+import events
+import listing
+import export
+import metrics
+import terms
+import validate
+import versions
+import whatif
+from static_assets import PrecompressedStatic
+from db import get_db
+from models import (
+    Teacher, Subject, ClassGroup, Room, TimeSlot, SubjectRequirement, Assignment, ScheduleVersion,
+    Term, WeekException, Student, Enrollment
+)
+from constraints import Search
+from problem import load_placement
+from scheduler import SolveConfig, generate_schedule
+
+# Resolved from this file, not the working directory, so the server can be
+# started from anywhere
+FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
+
+# Schema creation and demo seeding are one-time jobs (`python manage.py init-db`);
+# nothing here touches the database until the first request.
+
+router = APIRouter()
 
 # ---------- Schemas ----------
 class TeacherOut(BaseModel):
@@ -102,6 +87,37 @@ class AssignmentOut(BaseModel):
     teacher_id: int
     room_id: int
 
+class RequirementOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    class_id: int
+    subject_id: int
+    periods_per_week: int
+    block_length: int
+
+class RequirementIn(BaseModel):
+    class_id: int
+    subject_id: int
+    periods_per_week: int  # 0 drops the requirement
+    block_length: int = 1
+
+class ScenarioIn(BaseModel):
+    name: str = ""
+    add_rooms: List[int] = []             # capacities of hypothetical rooms (ids -1, -2, ...)
+    remove_rooms: List[int] = []
+    add_teachers: List[List[int]] = []    # subject ids per hypothetical teacher (ids -1, -2, ...)
+    remove_teachers: List[int] = []
+    class_sizes: Dict[int, int] = {}
+    requirements: List[RequirementIn] = []
+    engine: str = "greedy"
+    seed: int = SolveConfig.seed
+    time_limit: float = SolveConfig.time_limit
+    decompose: bool = False
+
+class WhatIfIn(BaseModel):
+    scenarios: List[ScenarioIn]
+
 class OverrideIn(BaseModel):
     class_id: int
     day: int
@@ -110,48 +126,153 @@ class OverrideIn(BaseModel):
     teacher_id: int
     room_id: int
 
+class TermIn(BaseModel):
+    name: str
+    start: date
+    weeks: int
+    patterns: Optional[List[int]] = None  # version ids, rotated week by week; default: the live schedule
+
+class WeekExceptionIn(BaseModel):
+    class_id: int
+    day: int
+    slot: int
+    subject_id: Optional[int] = None  # none: the lesson is cancelled that week
+    teacher_id: Optional[int] = None
+    room_id: Optional[int] = None
+    note: str = ""
+
+class ListQuery:
+    # ?fields=&q=&after=&limit= on the reference lists (see listing.py); the
+    # next page, if any, is in the Link header
+    def __init__(self, request: Request, response: Response, fields: Optional[str] = None,
+                 q: Optional[str] = None, after: Optional[int] = None,
+                 limit: Optional[int] = Query(None, ge=1, le=listing.MAX_LIMIT)):
+        self.request, self.response = request, response
+        self.fields, self.q, self.after, self.limit = fields, q, after, limit
+
+    def page(self, db: Session, model, schema, where=()):
+        try:
+            rows, next_after = listing.page(db, model, list(schema.model_fields), self.fields, self.q,
+                                            self.after, self.limit, where)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if next_after is not None:
+            self.response.headers["Link"] = f'<{self.request.url.include_query_params(after=next_after)}>; rel="next"'
+        return rows
+
 # ---------- API ----------
-@app.get("/api/teachers", response_model=List[TeacherOut])
-def get_teachers(db: Session = Depends(get_db)):
-    return db.query(Teacher).all()
+@router.get("/api/teachers")
+def get_teachers(page: ListQuery = Depends(), db: Session = Depends(get_db)):
+    return page.page(db, Teacher, TeacherOut)
 
-@app.get("/api/subjects", response_model=List[SubjectOut])
-def get_subjects(db: Session = Depends(get_db)):
-    return db.query(Subject).all()
+@router.get("/api/subjects")
+def get_subjects(page: ListQuery = Depends(), db: Session = Depends(get_db)):
+    return page.page(db, Subject, SubjectOut)
 
-@app.get("/api/classes", response_model=List[ClassGroupOut])
-def get_classes(db: Session = Depends(get_db)):
-    return db.query(ClassGroup).all()
+@router.get("/api/classes")
+def get_classes(page: ListQuery = Depends(), db: Session = Depends(get_db)):
+    return page.page(db, ClassGroup, ClassGroupOut)
 
-@app.get("/api/rooms", response_model=List[RoomOut])
-def get_rooms(db: Session = Depends(get_db)):
-    return db.query(Room).all()
+@router.get("/api/rooms")
+def get_rooms(page: ListQuery = Depends(), db: Session = Depends(get_db)):
+    return page.page(db, Room, RoomOut)
 
-@app.get("/api/timeslots", response_model=List[TimeSlotOut])
+@router.get("/api/timeslots", response_model=List[TimeSlotOut])
 def get_timeslots(db: Session = Depends(get_db)):
     return db.query(TimeSlot).order_by(TimeSlot.day, TimeSlot.slot).all()
 
-@app.get("/api/requirements")
-def get_requirements(db: Session = Depends(get_db)):
-    rows = db.query(SubjectRequirement).all()
-    out = []
-    for r in rows:
-        out.append({
-            "id": r.id,
-            "class_id": r.class_id,
-            "subject_id": r.subject_id,
-            "periods_per_week": r.periods_per_week
-        })
+@router.get("/api/classes/{class_id}/students", response_model=List[str])
+def get_class_students(class_id: int, db: Session = Depends(get_db)):
+    return [name for name, in (db.query(Student.name)
+                               .join(Enrollment, Enrollment.student_id == Student.id)
+                               .filter(Enrollment.class_id == class_id)
+                               .order_by(Student.name))]
+
+@router.put("/api/classes/{class_id}/students")
+def put_class_students(class_id: int, names: List[str], db: Session = Depends(get_db)):
+    # replaces the class's enrollment; students are created by name as needed
+    if db.get(ClassGroup, class_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown class")
+    return {"status": "ok", "students": enrollment.set_class_students(db, class_id, names)}
+
+@router.get("/api/conflicts")
+def get_conflicts(db: Session = Depends(get_db)):
+    # pairs of classes sharing students; the engines never overlap them
+    edges = enrollment.load_edges(db)
+    return [{"class_ids": [a, b], "students": n} for a, b, n in edges.tolist()]
+
+@router.get("/api/requirements")
+def get_requirements(class_id: Optional[int] = None, page: ListQuery = Depends(), db: Session = Depends(get_db)):
+    where = [SubjectRequirement.class_id == class_id] if class_id is not None else []
+    return page.page(db, SubjectRequirement, RequirementOut, where)
+
+# ---------- Revisions ----------
+# Every mutating schedule endpoint is a compare-and-swap on the live
+# revision (see versions.py). GET /api/schedule returns it as the ETag; a
+# client that sends it back as If-Match gets 412 when it is already stale.
+# Either way, a change that lands while the request is checking or solving
+# makes it fail with 409 instead of overwriting that change.
+def _base_revision(request: Request, db: Session) -> int:
+    current = versions.revision(db)
+    tag = request.headers.get("if-match")
+    if tag is None:
+        return current
+    try:
+        expected = int(tag.strip().strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a schedule revision")
+    if expected != current:
+        raise HTTPException(status_code=412, detail=f"The schedule is at revision {current}, not {expected}.")
+    return expected
+
+async def _stale_revision(request: Request, exc: versions.StaleRevision):
+    return JSONResponse(status_code=409, content={"detail": str(exc), "revision": exc.current})
+
+async def _database_locked(request: Request, exc: OperationalError):
+    # another writer held the lock past db.BUSY_TIMEOUT: fail fast, let the client retry
+    if "database is locked" not in str(exc.orig):
+        raise exc
+    return JSONResponse(status_code=503, content={"detail": "The schedule is busy, try again."},
+                        headers={"Retry-After": "1"})
+
+@router.post("/api/schedule/generate")
+def post_generate(request: Request, engine: str = "greedy", decompose: bool = False, workers: Optional[int] = None,
+                  seed: int = SolveConfig.seed, time_limit: float = SolveConfig.time_limit,
+                  name: Optional[str] = None, activate: bool = True, profile: bool = False,
+                  db: Session = Depends(get_db)):
+    revision = _base_revision(request, db)
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        config = SolveConfig(engine=engine, seed=seed, time_limit=time_limit, workers=workers,
+                             decompose=decompose)
+        stats = generate_schedule(db, config, name=name, activate=activate, revision=revision)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    out = {"status": "ok", "stats": stats, "revision": stats["revision"]}
+    if profiler is not None:
+        import io, pstats
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(30)
+        out["profile"] = buf.getvalue()
     return out
 
-@app.post("/api/schedule/generate")
-def post_generate(db: Session = Depends(get_db)):
-    stats = generate_schedule(db)
-    return {"status": "ok", "stats": stats}
-
-@app.get("/api/schedule")
-def get_schedule(class_id: Optional[int] = None, db: Session = Depends(get_db)):
-    # Return schedule as: { class_id: { (day,slot): {subject, teacher, room} } }
+@router.get("/api/schedule")
+def get_schedule(request: Request, response: Response, class_id: Optional[int] = None,
+                 db: Session = Depends(get_db)):
+    # Return schedule as: { class_id: { "day,slot": {subject, teacher, room} } }
+    # with the live revision as the ETag (read first, so it is never newer
+    # than the rows)
+    etag = f'"{versions.revision(db)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     q = (db.query(Assignment, TimeSlot, Subject, Teacher, Room)
          .join(TimeSlot, Assignment.timeslot_id == TimeSlot.id)
          .join(Subject, Assignment.subject_id == Subject.id)
@@ -166,7 +287,7 @@ def get_schedule(class_id: Optional[int] = None, db: Session = Depends(get_db)):
         key = a.class_id
         if key not in data:
             data[key] = {}
-        data[key][(ts.day, ts.slot)] = {
+        data[key][f"{ts.day},{ts.slot}"] = {
             "assignment_id": a.id,
             "subject_id": s.id, "subject": s.name,
             "teacher_id": t.id, "teacher": t.name,
@@ -175,14 +296,25 @@ def get_schedule(class_id: Optional[int] = None, db: Session = Depends(get_db)):
         }
     return data
 
-@app.post("/api/schedule/clear")
-def clear_schedule(db: Session = Depends(get_db)):
-    db.query(Assignment).delete()
-    db.commit()
-    return {"status": "ok"}
-
-@app.post("/api/schedule/override")
-def override_slot(payload: OverrideIn, db: Session = Depends(get_db)):
+@router.get("/api/schedule/events")
+async def schedule_events(request: Request, class_id: Optional[int] = None):
+    # Server-sent per-cell deltas whenever the live schedule changes (see events.py)
+    return StreamingResponse(events.stream(request, class_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/api/schedule/clear")
+def clear_schedule(request: Request, db: Session = Depends(get_db)):
+    # Clearing is just another version, so it can be rolled back
+    revision = _base_revision(request, db)
+    current = versions.active_version(db)
+    v = versions.commit_version(db, versions.state_changes(versions.materialize(db, current.id), {}), "clear",
+                                revision=revision)
+    return {"status": "ok", "version_id": v.id, "revision": revision + 1}
+
+@router.post("/api/schedule/override")
+def override_slot(payload: OverrideIn, request: Request, db: Session = Depends(get_db)):
+    # the checks below read this revision; the write only lands on it
+    revision = _base_revision(request, db)
     # resolve timeslot_id
     ts = (db.query(TimeSlot)
           .filter(TimeSlot.day == payload.day, TimeSlot.slot == payload.slot)
@@ -190,224 +322,291 @@ def override_slot(payload: OverrideIn, db: Session = Depends(get_db)):
     if not ts:
         raise HTTPException(status_code=400, detail="Invalid day/slot")
 
-    # conflict checks
-    # class conflict
+    # conflict checks, by the same registered constraints the engines use,
+    # against only the rows this placement can touch
+    try:
+        problem = load_placement(db, payload.class_id, payload.subject_id, payload.teacher_id,
+                                 payload.room_id, (ts.id, ts.day, ts.slot))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown {e.args[0]}")
+    # the class's current assignment in this slot (if any) is being replaced,
+    # so only other classes can conflict: on the teacher, the room or a
+    # shared student
+    others = (db.query(Assignment.class_id, Assignment.timeslot_id, Assignment.subject_id,
+                       Assignment.teacher_id, Assignment.room_id)
+              .filter(Assignment.timeslot_id == ts.id,
+                      Assignment.class_id != payload.class_id,
+                      or_(Assignment.teacher_id == payload.teacher_id,
+                          Assignment.room_id == payload.room_id,
+                          Assignment.class_id.in_(problem.conflicts.get(payload.class_id, [])))))
+    search = Search(problem, occupied=others.all())
+    refused = search.violation(payload.class_id, payload.subject_id, payload.teacher_id, payload.room_id,
+                               ts.day, 1 << ts.slot)
+    if refused is not None:
+        raise HTTPException(status_code=409, detail=refused.message)
+
     existing_for_class = (db.query(Assignment)
-                         .filter(Assignment.class_id == payload.class_id, 
+                         .filter(Assignment.class_id == payload.class_id,
                                 Assignment.timeslot_id == ts.id)
                          .first())
-    if existing_for_class:
-        db.delete(existing_for_class)
-        db.commit()
-
-    # teacher conflict
-    t_conflict = (db.query(Assignment)
-                  .filter(Assignment.teacher_id == payload.teacher_id, 
-                         Assignment.timeslot_id == ts.id)
-                  .first())
-    if t_conflict:
-        raise HTTPException(status_code=409, detail="Teacher already booked in this slot.")
-
-    # room conflict
-    r_conflict = (db.query(Assignment)
-                  .filter(Assignment.room_id == payload.room_id, 
-                         Assignment.timeslot_id == ts.id)
-                  .first())
-    if r_conflict:
-        raise HTTPException(status_code=409, detail="Room already booked in this slot.")
-
-    # insert
-    a = Assignment(
-        class_id=payload.class_id,
-        timeslot_id=ts.id,
-        subject_id=payload.subject_id,
-        teacher_id=payload.teacher_id,
-        room_id=payload.room_id
-    )
-    db.add(a)
+    before = ((existing_for_class.subject_id, existing_for_class.teacher_id, existing_for_class.room_id)
+              if existing_for_class else None)
+    after = (payload.subject_id, payload.teacher_id, payload.room_id)
+
+    # recorded as a one-row version on top of the active one
+    v = versions.commit_version(db, [((payload.class_id, ts.id), before, after)], "override",
+                                revision=revision)
+    a = (db.query(Assignment)
+         .filter(Assignment.class_id == payload.class_id,
+                 Assignment.timeslot_id == ts.id)
+         .first())
+    return {"status": "ok", "assignment_id": a.id, "version_id": v.id, "revision": revision + 1}
+
+# ---------- Validation ----------
+@router.get("/api/schedule/validate")
+def validate_schedule(version_id: Optional[int] = None, limit: int = Query(validate.LIMIT, ge=0, le=10000),
+                      db: Session = Depends(get_db)):
+    # every teacher/room/class double-booking, unqualified teacher, over-capacity
+    # room and requirement shortfall in the live schedule (or a stored version)
+    try:
+        return validate.validate(db, version_id, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown version")
+
+# ---------- Analytics ----------
+def _analytics(db: Session, version_id: Optional[int]):
+    try:
+        return analytics.analytics(db, version_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown version")
+
+@router.get("/api/analytics")
+def get_analytics(version_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # headline figures: overall occupancy and seat fill, peak timeslot and period
+    a = _analytics(db, version_id)
+    return {"version_id": a["version_id"], "assignments": a["assignments"], **a["summary"]}
+
+@router.get("/api/analytics/{section}")
+def get_analytics_section(section: str, version_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # rooms | teachers | timeslots | slots, cached per schedule version
+    if section not in ("rooms", "teachers", "timeslots", "slots"):
+        raise HTTPException(status_code=404, detail="Unknown analytics section")
+    a = _analytics(db, version_id)
+    return {"version_id": a["version_id"], section: a[section]}
+
+# ---------- What-if ----------
+@router.post("/api/whatif")
+def post_whatif(payload: WhatIfIn, limit: int = Query(whatif.LIMIT, ge=0, le=10000),
+                db: Session = Depends(get_db)):
+    # Solves each scenario's change set against an in-memory copy of the
+    # problem, in parallel worker processes; the database is only read
+    try:
+        scenarios = [whatif.Scenario(
+            name=s.name, add_rooms=s.add_rooms, remove_rooms=s.remove_rooms, add_teachers=s.add_teachers,
+            remove_teachers=s.remove_teachers, class_sizes=s.class_sizes,
+            requirements=[(r.class_id, r.subject_id, r.periods_per_week, r.block_length) for r in s.requirements],
+            config=SolveConfig(engine=s.engine, seed=s.seed, time_limit=s.time_limit, decompose=s.decompose),
+        ) for s in payload.scenarios]
+        result = whatif.run(db, scenarios, limit)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for s in result["scenarios"]:
+        s["unplaced"] = [{"class_id": c, "subject_id": sub, "periods": n} for c, sub, n in s["unplaced"]]
+        s["changes"] = [{"class_id": c, "timeslot_id": ts, "before": _row_out(before), "after": _row_out(after)}
+                        for (c, ts), before, after in s["changes"]]
+    return result
+
+# ---------- Export ----------
+@router.get("/api/export/schedule.{fmt}")
+def export_schedule(fmt: str, request: Request, by: str = "class",
+                    entity_id: Optional[int] = Query(None, alias="id"),
+                    start: Optional[date] = None, db: Session = Depends(get_db)):
+    # by=class|teacher, id=<class or teacher id> (all if omitted),
+    # start=<term start date> for .ics (defaults to this week's Monday)
+    if fmt not in export.FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown export format")
+    if by not in ("class", "teacher"):
+        raise HTTPException(status_code=400, detail="by must be 'class' or 'teacher'")
+    versions.active_version(db)  # adopts a root version on first use
     db.commit()
-    db.refresh(a)
-    return {"status": "ok", "assignment_id": a.id}
-
-# Serve frontend (static) from /
-app.mount("/", StaticFiles(directory="../frontend", html=True), name="static")
-
-# ---------- Schemas ----------
-class TeacherOut(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
-    id: int
-    name: str
-
-class SubjectOut(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
-    id: int
-    name: str
-
-class ClassGroupOut(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
-    id: int
-    name: str
-    size: int
-
-class RoomOut(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
-    id: int
-    name: str
-    capacity: int
-    has_projector: bool
-    has_smart_board: bool
-
-class TimeSlotOut(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
-    id: int
-    day: int
-    slot: int
-    label: str
-
-class AssignmentOut(BaseModel):
-    model_config = ConfigDict(from_attributes=True)
-    
-    id: int
-    class_id: int
-    timeslot_id: int
-    subject_id: int
-    teacher_id: int
-    room_id: int
-
-class OverrideIn(BaseModel):
-    class_id: int
-    day: int
-    slot: int
-    subject_id: int
-    teacher_id: int
-    room_id: int
-
-# ---------- API ----------
-@app.get("/api/teachers", response_model=List[TeacherOut])
-def get_teachers(db: Session = Depends(get_db)):
-    return db.query(Teacher).all()
-
-@app.get("/api/subjects", response_model=List[SubjectOut])
-def get_subjects(db: Session = Depends(get_db)):
-    return db.query(Subject).all()
-
-@app.get("/api/classes", response_model=List[ClassGroupOut])
-def get_classes(db: Session = Depends(get_db)):
-    return db.query(ClassGroup).all()
-
-@app.get("/api/rooms", response_model=List[RoomOut])
-def get_rooms(db: Session = Depends(get_db)):
-    return db.query(Room).all()
-
-@app.get("/api/timeslots", response_model=List[TimeSlotOut])
-def get_timeslots(db: Session = Depends(get_db)):
-    return db.query(TimeSlot).order_by(TimeSlot.day, TimeSlot.slot).all()
-
-@app.get("/api/requirements")
-def get_requirements(db: Session = Depends(get_db)):
-    rows = db.query(SubjectRequirement).all()
-    out = []
-    for r in rows:
-        out.append({
-            "id": r.id,
-            "class_id": r.class_id,
-            "subject_id": r.subject_id,
-            "periods_per_week": r.periods_per_week
-        })
-    return out
-
-@app.post("/api/schedule/generate")
-def post_generate(db: Session = Depends(get_db)):
-    stats = generate_schedule(db)
-    return {"status": "ok", "stats": stats}
-
-@app.get("/api/schedule")
-def get_schedule(class_id: Optional[int] = None, db: Session = Depends(get_db)):
-    # Return schedule as: { class_id: { (day,slot): {subject, teacher, room} } }
-    q = (db.query(Assignment, TimeSlot, Subject, Teacher, Room)
-         .join(TimeSlot, Assignment.timeslot_id == TimeSlot.id)
-         .join(Subject, Assignment.subject_id == Subject.id)
-         .join(Teacher, Assignment.teacher_id == Teacher.id)
-         .join(Room, Assignment.room_id == Room.id))
-
-    if class_id is not None:
-        q = q.filter(Assignment.class_id == class_id)
+    term_start = export.monday_of(start or date.today())
+
+    # Exports are immutable per schedule version: revalidate with the version
+    # in the ETag, serve the on-disk copy once one stream has completed. The
+    # version is read in the snapshot the export is streamed from.
+    conn, version_id = export.snapshot()
+    cached = export.cache_path(version_id, fmt, by, entity_id, term_start)
+    filename = f"timetable-{by}{'-' + str(entity_id) if entity_id is not None else ''}.{fmt}"
+    disposition = "inline" if fmt == "html" else "attachment"
+    headers = {"ETag": f'"{cached.stem}"', "Cache-Control": "no-cache",
+               "Content-Disposition": f'{disposition}; filename="{filename}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        conn.close()
+        return Response(status_code=304, headers=headers)
+    if export.hit(cached):
+        conn.close()
+        return FileResponse(cached, media_type=export.FORMATS[fmt], headers=headers)
+    return StreamingResponse(export.stream(conn, version_id, fmt, by, entity_id, term_start),
+                             media_type=export.FORMATS[fmt], headers=headers)
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ---------- Schedule versions ----------
+def _row_out(row):
+    if row is None:
+        return None
+    return {"subject_id": row[0], "teacher_id": row[1], "room_id": row[2]}
+
+@router.get("/api/schedule/versions")
+def list_versions(db: Session = Depends(get_db)):
+    active = versions.active_version(db).id
+    db.commit()
+    rows = (db.query(ScheduleVersion.id, ScheduleVersion.name, ScheduleVersion.parent_id,
+                     ScheduleVersion.created_at, ScheduleVersion.size, ScheduleVersion.changed,
+                     ScheduleVersion.config)
+            .order_by(ScheduleVersion.id.desc()).all())
+    return [{
+        "id": r.id, "name": r.name, "parent_id": r.parent_id,
+        "created_at": r.created_at.isoformat(), "size": r.size, "changed": r.changed,
+        "config": json.loads(r.config) if r.config else None,
+        "active": r.id == active
+    } for r in rows]
+
+@router.get("/api/schedule/versions/{a_id}/diff/{b_id}")
+def diff_versions(a_id: int, b_id: int, db: Session = Depends(get_db)):
+    try:
+        changes = versions.diff(db, a_id, b_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown version")
+    return {"changes": [{
+        "class_id": c, "timeslot_id": ts,
+        "before": _row_out(before), "after": _row_out(after)
+    } for (c, ts), before, after in changes]}
+
+@router.post("/api/schedule/versions/{version_id}/activate")
+def activate_version(version_id: int, request: Request, db: Session = Depends(get_db)):
+    revision = _base_revision(request, db)
+    try:
+        changes, revision = versions.activate(db, version_id, revision=revision)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown version")
+    return {"status": "ok", "changed": len(changes), "revision": revision}
+
+# ---------- Terms ----------
+def _term_out(t: Term):
+    return {"id": t.id, "name": t.name, "start": t.start.isoformat(), "weeks": t.weeks,
+            "patterns": [p.version_id for p in t.patterns]}
+
+def _get_term(db: Session, term_id: int) -> Term:
+    term = db.get(Term, term_id)
+    if term is None:
+        raise HTTPException(status_code=404, detail="Unknown term")
+    return term
+
+@router.get("/api/terms")
+def list_terms(db: Session = Depends(get_db)):
+    return [_term_out(t) for t in db.query(Term).order_by(Term.start, Term.id)]
+
+@router.post("/api/terms")
+def create_term(payload: TermIn, db: Session = Depends(get_db)):
+    if db.query(Term).filter(Term.name == payload.name).first():
+        raise HTTPException(status_code=409, detail="A term with this name exists")
+    try:
+        term = terms.create_term(db, payload.name, payload.start, payload.weeks, payload.patterns)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown version")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _term_out(term)
+
+@router.get("/api/terms/{term_id}/weeks/{week}")
+def get_term_week(term_id: int, week: int, class_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # one week of the term: its rotation pattern with that week's exceptions
+    # patched in, in the same shape as /api/schedule
+    term = _get_term(db, term_id)
+    try:
+        state = terms.week_state(db, term, week)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    slots = {ts.id: ts for ts in db.query(TimeSlot)}
+    subjects = dict(db.query(Subject.id, Subject.name).all())
+    teachers = dict(db.query(Teacher.id, Teacher.name).all())
+    rooms = dict(db.query(Room.id, Room.name).all())
+    notes = {(e.class_id, e.timeslot_id): e.note for e in terms.week_exceptions(db, term.id, week)}
 
     data = {}
-    for a, ts, s, t, r in q.all():
-        key = a.class_id
-        if key not in data:
-            data[key] = {}
-        data[key][(ts.day, ts.slot)] = {
-            "assignment_id": a.id,
-            "subject_id": s.id, "subject": s.name,
-            "teacher_id": t.id, "teacher": t.name,
-            "room_id": r.id, "room": r.name,
-            "label": ts.label
+    for (c_id, ts_id), (s_id, t_id, r_id) in state.items():
+        if class_id is not None and c_id != class_id:
+            continue
+        ts = slots[ts_id]
+        data.setdefault(c_id, {})[f"{ts.day},{ts.slot}"] = {
+            "subject_id": s_id, "subject": subjects.get(s_id),
+            "teacher_id": t_id, "teacher": teachers.get(t_id),
+            "room_id": r_id, "room": rooms.get(r_id),
+            "label": ts.label,
+            "exception": notes.get((c_id, ts_id)),
         }
-    return data
-
-@app.post("/api/schedule/clear")
-def clear_schedule(db: Session = Depends(get_db)):
-    db.query(Assignment).delete()
-    db.commit()
-    return {"status": "ok"}
-
-@app.post("/api/schedule/override")
-def override_slot(payload: OverrideIn, db: Session = Depends(get_db)):
-    # resolve timeslot_id
+    start, end = terms.week_dates(term, week)
+    return {"week": week, "start": start.isoformat(), "end": end.isoformat(),
+            "pattern_version_id": terms.week_pattern(term, week), "exceptions": len(notes),
+            "schedule": data}
+
+@router.post("/api/terms/{term_id}/weeks/{week}/exceptions")
+def set_week_exception(term_id: int, week: int, payload: WeekExceptionIn, db: Session = Depends(get_db)):
+    term = _get_term(db, term_id)
     ts = (db.query(TimeSlot)
           .filter(TimeSlot.day == payload.day, TimeSlot.slot == payload.slot)
           .first())
     if not ts:
         raise HTTPException(status_code=400, detail="Invalid day/slot")
-
-    # conflict checks
-    # class conflict
-    existing_for_class = (db.query(Assignment)
-                         .filter(Assignment.class_id == payload.class_id, 
-                                Assignment.timeslot_id == ts.id)
-                         .first())
-    if existing_for_class:
-        db.delete(existing_for_class)
-        db.commit()
-
-    # teacher conflict
-    t_conflict = (db.query(Assignment)
-                  .filter(Assignment.teacher_id == payload.teacher_id, 
-                         Assignment.timeslot_id == ts.id)
-                  .first())
-    if t_conflict:
-        raise HTTPException(status_code=409, detail="Teacher already booked in this slot.")
-
-    # room conflict
-    r_conflict = (db.query(Assignment)
-                  .filter(Assignment.room_id == payload.room_id, 
-                         Assignment.timeslot_id == ts.id)
-                  .first())
-    if r_conflict:
-        raise HTTPException(status_code=409, detail="Room already booked in this slot.")
-
-    # insert
-    a = Assignment(
-        class_id=payload.class_id,
-        timeslot_id=ts.id,
-        subject_id=payload.subject_id,
-        teacher_id=payload.teacher_id,
-        room_id=payload.room_id
-    )
-    db.add(a)
+    row = None
+    if payload.subject_id is not None:
+        if payload.teacher_id is None or payload.room_id is None:
+            raise HTTPException(status_code=400, detail="A replacement lesson needs a teacher and a room")
+        row = (payload.subject_id, payload.teacher_id, payload.room_id)
+    try:
+        e = terms.set_exception(db, term, week, payload.class_id, ts, row, payload.note)
+    except terms.Refused as refused:
+        raise HTTPException(status_code=409, detail=str(refused))
+    except KeyError as err:
+        raise HTTPException(status_code=404, detail=f"Unknown {err.args[0]}")
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    return {"status": "ok", "exception_id": e.id}
+
+@router.post("/api/terms/{term_id}/weeks/{week}/holiday")
+def cancel_week_day(term_id: int, week: int, day: int, note: str = "holiday", db: Session = Depends(get_db)):
+    term = _get_term(db, term_id)
+    try:
+        cancelled = terms.cancel_day(db, term, week, day, note)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", "cancelled": cancelled}
+
+@router.delete("/api/terms/{term_id}/exceptions/{exception_id}")
+def delete_week_exception(term_id: int, exception_id: int, db: Session = Depends(get_db)):
+    e = db.get(WeekException, exception_id)
+    if e is None or e.term_id != term_id:
+        raise HTTPException(status_code=404, detail="Unknown exception")
+    db.delete(e)
     db.commit()
-    db.refresh(a)
-    return {"status": "ok", "assignment_id": a.id}
-
-
-
-
-
+    return {"status": "ok"}
 
+def create_app() -> FastAPI:
+    app = FastAPI(title="Smart Classroom & Timetable Scheduler")
+    app.add_middleware(metrics.TimingMiddleware)
+    app.add_exception_handler(versions.StaleRevision, _stale_revision)
+    app.add_exception_handler(OperationalError, _database_locked)
+    app.include_router(router)
+    # Serve frontend (static) from /: the fingerprinted, precompressed build
+    # when one exists (`python manage.py build-frontend`), the sources otherwise
+    dist = FRONTEND_DIR / "dist"
+    if PrecompressedStatic.available(dist):
+        app.mount("/", PrecompressedStatic(dist), name="static")
+    else:
+        app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="static")
+    return app
+
+app = create_app()
@@ -0,0 +1,378 @@
+from __future__ import annotations
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from enrollment import cliques
+from problem import Problem, Placement
+
+# The hard rules of a timetable, each written once for every path that needs it:
+#
+#   search       greedy solving and override checks: static candidate pruning
+#                (teachers(), rooms()), computed once per solve, plus an
+#                incremental tracker that checks a block with one bitmask AND
+#   encode       CP-SAT: constraints over the model's placement choices
+#   violations   the validator: one vectorised pass over the assignment arrays
+#
+# The engines, the override endpoint and /api/schedule/validate all iterate the
+# same registry, so a rule added with register() is enforced and reported
+# everywhere at once. Worker processes of a decomposed solve see the registry
+# as it was when they were forked.
+
+CLASS, TIMESLOT, SUBJECT, TEACHER, ROOM = range(5)
+DENSE_MAX = 1 << 22  # largest id x id table built for a membership test
+
+@dataclass
+class Choice:
+    # one CP-SAT option: a block of class_id/subject_id covering `timeslots`
+    var: object
+    block: int
+    class_id: int
+    subject_id: int
+    day: int
+    mask: int
+    timeslots: List[int]
+    teacher_id: int
+    room_id: int
+
+@dataclass
+class Tables:
+    # validator input, all int64
+    assign: np.ndarray         # (n, 5) class_id, timeslot_id, subject_id, teacher_id, room_id
+    qual: np.ndarray           # (m, 2) teacher_id, subject_id
+    class_size: np.ndarray     # (k, 2) class_id, size
+    room_capacity: np.ndarray  # (k, 2) room_id, capacity
+    requirements: np.ndarray   # (r, 3) class_id, subject_id, periods
+    conflicts: np.ndarray = field(default_factory=lambda: np.empty((0, 3), dtype=np.int64))
+    # (e, 3) class_a, class_b, shared students (see enrollment.py)
+
+class Tracker:
+    # Incremental search state for one constraint. `level` names the entity
+    # it is keyed on ("class", "teacher" or "room"); the greedy engine asks it
+    # at the point in its loops where that entity is chosen.
+    level = "class"
+
+    def free(self, entity: int, day: int, mask: int) -> bool:
+        return True
+
+    def book(self, entity: int, day: int, mask: int) -> None:
+        pass
+
+    def first_free(self, entities: List[int], day: int, mask: int) -> int:
+        # index of the first entity free for the block, -1 if none; override
+        # for speed, scans over all rooms are the greedy engine's hot loop
+        for i, entity in enumerate(entities):
+            if self.free(entity, day, mask):
+                return i
+        return -1
+
+class Constraint:
+    name = ""     # key in validator output
+    message = ""  # why a single placement was refused
+
+    def teachers(self, problem: Problem, class_id: int, subject_id: int, teacher_ids: List[int]) -> List[int]:
+        return teacher_ids
+
+    def rooms(self, problem: Problem, class_id: int, rooms: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        return rooms
+
+    def tracker(self, problem: Problem) -> Optional[Tracker]:
+        return None
+
+    def encode(self, model, problem: Problem, choices: List[Choice]) -> None:
+        pass
+
+    def violations(self, tables: Tables, limit: int) -> Tuple[int, List[dict]]:
+        return 0, []
+
+# ---------- Array helpers ----------
+def _key(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a.astype(np.int64) << 32) | b.astype(np.int64)
+
+def _find(sorted_keys: np.ndarray, keys: np.ndarray):
+    # positions of keys in sorted_keys, and whether each one is there
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    i = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return i, sorted_keys[i] == keys
+
+def _lookup(ids: np.ndarray, values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    # gather through a dense id -> value table (ids are small autoincrement keys);
+    # unknown ids read as 0
+    table = np.zeros(max(int(ids.max(initial=0)), int(index.max(initial=0))) + 1, dtype=np.int64)
+    table[ids] = values
+    return table[index]
+
+# ---------- Built-in constraints ----------
+class _Busy(Tracker):
+    def __init__(self, level: str):
+        self.level = level
+        self.busy: Dict[Tuple[int, int], int] = defaultdict(int)  # (entity, day) -> slot mask
+
+    def free(self, entity: int, day: int, mask: int) -> bool:
+        return not self.busy[(entity, day)] & mask
+
+    def book(self, entity: int, day: int, mask: int) -> None:
+        self.busy[(entity, day)] |= mask
+
+    def first_free(self, entities, day, mask):
+        busy = self.busy
+        for i, entity in enumerate(entities):
+            if not busy[(entity, day)] & mask:
+                return i
+        return -1
+
+class Exclusive(Constraint):
+    # a class / teacher / room is in at most one lesson per timeslot
+    def __init__(self, level: str, col: int, message: str):
+        self.level = level
+        self.col = col
+        self.name = f"{level}_conflicts"
+        self.message = message
+
+    def tracker(self, problem):
+        return _Busy(self.level)
+
+    def encode(self, model, problem, choices):
+        load = defaultdict(list)
+        attr = f"{self.level}_id"
+        for ch in choices:
+            entity = getattr(ch, attr)
+            for ts_id in ch.timeslots:
+                load[(entity, ts_id)].append(ch.var)
+        for xs in load.values():
+            if len(xs) > 1:
+                model.AddAtMostOne(xs)
+
+    def violations(self, tables, limit):
+        # (entity, timeslot) as a dense code: timeslot ids are few, so bincount
+        # over the codes is the cheapest way to count bookings per key
+        assign, col = tables.assign, self.col
+        width = int(assign[:, TIMESLOT].max(initial=0)) + 1
+        codes = assign[:, col] * width + assign[:, TIMESLOT]
+        per_key = np.bincount(codes)
+        clashing = np.flatnonzero(per_key > 1)
+        out = []
+        if clashing.size:
+            # rows of the first `limit` clashing keys, grouped by key
+            listed = clashing[:limit]
+            rows = np.flatnonzero((per_key[codes] > 1) & (codes <= listed[-1]))
+            order = rows[np.argsort(codes[rows], kind="stable")]
+            for g in np.split(order, np.flatnonzero(np.diff(codes[order])) + 1):
+                out.append({f"{self.level}_id": int(assign[g[0], col]), "timeslot_id": int(assign[g[0], TIMESLOT]),
+                            "class_ids": assign[g, CLASS].tolist()})
+        return len(clashing), out
+
+class Qualified(Constraint):
+    name = "unqualified"
+    message = "Teacher is not qualified for this subject."
+
+    def teachers(self, problem, class_id, subject_id, teacher_ids):
+        qualified = set(problem.qual.get(subject_id, ()))
+        return [t for t in teacher_ids if t in qualified]
+
+    # CP-SAT only creates choices for teachers() candidates: nothing to encode
+
+    def violations(self, tables, limit):
+        assign, qual = tables.assign, tables.qual
+        teachers, subjects = assign[:, TEACHER], assign[:, SUBJECT]
+        # a dense teacher x subject bitmap when the id ranges allow it, sorted
+        # composite keys otherwise
+        width = int(max(qual[:, 1].max(initial=0), subjects.max(initial=0))) + 1
+        height = int(max(qual[:, 0].max(initial=0), teachers.max(initial=0))) + 1
+        if width * height <= DENSE_MAX:
+            table = np.zeros(width * height, dtype=bool)
+            table[qual[:, 0] * width + qual[:, 1]] = True
+            ok = table[teachers * width + subjects]
+        else:
+            ok = _find(np.sort(_key(qual[:, 0], qual[:, 1])), _key(teachers, subjects))[1]
+        bad = np.flatnonzero(~ok)
+        return len(bad), [{"class_id": int(r[CLASS]), "timeslot_id": int(r[TIMESLOT]),
+                           "subject_id": int(r[SUBJECT]), "teacher_id": int(r[TEACHER])}
+                          for r in assign[bad[:limit]]]
+
+class Capacity(Constraint):
+    name = "over_capacity"
+    message = "Room is too small for this class."
+
+    def rooms(self, problem, class_id, rooms):
+        size = problem.class_sizes.get(class_id, 0)
+        return [r for r in rooms if r[1] >= size]
+
+    def violations(self, tables, limit):
+        assign = tables.assign
+        sizes = _lookup(tables.class_size[:, 0], tables.class_size[:, 1], assign[:, CLASS])
+        caps = _lookup(tables.room_capacity[:, 0], tables.room_capacity[:, 1], assign[:, ROOM])
+        bad = np.flatnonzero(sizes > caps)
+        return len(bad), [{"class_id": int(assign[i, CLASS]), "timeslot_id": int(assign[i, TIMESLOT]),
+                           "room_id": int(assign[i, ROOM]), "size": int(sizes[i]), "capacity": int(caps[i])}
+                          for i in bad[:limit]]
+
+class _Neighbours(Tracker):
+    # booking a class blocks the same slots for every class sharing students with it
+    level = "class"
+
+    def __init__(self, conflicts: Dict[int, List[int]]):
+        self.conflicts = conflicts
+        self.blocked: Dict[Tuple[int, int], int] = defaultdict(int)  # (class_id, day) -> slot mask
+
+    def free(self, entity, day, mask):
+        return not self.blocked[(entity, day)] & mask
+
+    def book(self, entity, day, mask):
+        for other in self.conflicts.get(entity, ()):
+            self.blocked[(other, day)] |= mask
+
+class StudentConflicts(Constraint):
+    # no student is in two lessons at once: classes sharing students
+    # (problem.conflicts) never overlap
+    name = "student_conflicts"
+    message = "A student of this class has another lesson in this slot."
+
+    def tracker(self, problem):
+        return _Neighbours(problem.conflicts) if problem.conflicts else None
+
+    def encode(self, model, problem, choices):
+        # graph-colouring style: one at-most-one per clique of the conflict
+        # graph and timeslot, rather than one constraint per edge
+        if not problem.conflicts:
+            return
+        load = defaultdict(list)  # (class_id, timeslot_id) -> vars
+        for ch in choices:
+            if ch.class_id in problem.conflicts:
+                for ts_id in ch.timeslots:
+                    load[(ch.class_id, ts_id)].append(ch.var)
+        for clique in cliques(problem.conflicts):
+            for ts_id, _, _ in problem.timeslots:
+                xs = [x for c_id in clique for x in load.get((c_id, ts_id), ())]
+                if len(xs) > 1:
+                    model.AddAtMostOne(xs)
+
+    def violations(self, tables, limit):
+        edges, assign = tables.conflicts, tables.assign
+        if not len(edges) or not len(assign):
+            return 0, []
+        # class x timeslot occupancy bitmap, then both ends of every edge at once
+        width = int(assign[:, TIMESLOT].max()) + 1
+        height = int(max(assign[:, CLASS].max(), edges[:, :2].max())) + 1
+        occupied = np.zeros((height, width), dtype=bool)
+        occupied[assign[:, CLASS], assign[:, TIMESLOT]] = True
+        edge_i, ts = np.nonzero(occupied[edges[:, 0]] & occupied[edges[:, 1]])
+        return len(edge_i), [{"class_ids": [int(edges[e, 0]), int(edges[e, 1])], "timeslot_id": int(t),
+                              "students": int(edges[e, 2])}
+                             for e, t in zip(edge_i[:limit].tolist(), ts[:limit].tolist())]
+
+class Requirements(Constraint):
+    # the engines maximise placed periods, so this one is only reported
+    name = "shortfall"
+
+    def violations(self, tables, limit):
+        assign, req = tables.assign, tables.requirements
+        placed_keys, placed = np.unique(_key(assign[:, CLASS], assign[:, SUBJECT]), return_counts=True)
+        i, found = _find(placed_keys, _key(req[:, 0], req[:, 1]))
+        have = np.where(found, placed[i] if len(placed) else 0, 0)
+        bad = np.flatnonzero(have < req[:, 2])
+        return len(bad), [{"class_id": int(req[i, 0]), "subject_id": int(req[i, 1]),
+                           "needed": int(req[i, 2]), "placed": int(have[i])}
+                          for i in bad[:limit]]
+
+# ---------- Registry ----------
+_registry: List[Constraint] = [
+    Exclusive("class", CLASS, "Class already has a lesson in this slot."),
+    Exclusive("teacher", TEACHER, "Teacher already booked in this slot."),
+    Exclusive("room", ROOM, "Room already booked in this slot."),
+    StudentConflicts(),
+    Qualified(),
+    Capacity(),
+    Requirements(),
+]
+
+def register(constraint: Constraint) -> None:
+    # replaces a registered constraint of the same name
+    _registry[:] = [c for c in _registry if c.name != constraint.name] + [constraint]
+
+def registry() -> List[Constraint]:
+    return list(_registry)
+
+# ---------- Search state ----------
+class Search:
+    # Per-solve view of the registry for greedy search and single-move checks
+    def __init__(self, problem: Problem, constraints: Optional[List[Constraint]] = None,
+                 occupied: Iterable[Placement] = ()):
+        self.problem = problem
+        self.constraints = registry() if constraints is None else constraints
+        self.trackers: Dict[str, List[Tuple[Constraint, Tracker]]] = {"class": [], "teacher": [], "room": []}
+        for con in self.constraints:
+            tr = con.tracker(problem)
+            if tr is not None:
+                self.trackers[tr.level].append((con, tr))
+        self._teachers: Dict[Tuple[int, int], List[int]] = {}
+        self._rooms: Dict[int, List[Tuple[int, int]]] = {}
+        # Placements made elsewhere (e.g. other components of a decomposed solve)
+        slot_of = {ts_id: (day, slot) for ts_id, day, slot in problem.timeslots}
+        for c_id, ts_id, s_id, t_id, r_id in occupied:
+            day, slot = slot_of[ts_id]
+            self.book(c_id, t_id, r_id, day, 1 << slot)
+
+    def teachers(self, class_id: int, subject_id: int) -> List[int]:
+        key = (class_id, subject_id)
+        if key not in self._teachers:
+            ids = list(self.problem.qual.get(subject_id, []))
+            for con in self.constraints:
+                ids = con.teachers(self.problem, class_id, subject_id, ids)
+            self._teachers[key] = ids
+        return self._teachers[key]
+
+    def rooms(self, class_id: int) -> List[Tuple[int, int]]:
+        if class_id not in self._rooms:
+            rooms = self.problem.rooms
+            for con in self.constraints:
+                rooms = con.rooms(self.problem, class_id, rooms)
+            self._rooms[class_id] = rooms
+        return self._rooms[class_id]
+
+    def checker(self, level: str) -> Callable[[int, int, int], bool]:
+        # free(entity, day, mask) for one level, bound once for the hot loop
+        trackers = [tr for _, tr in self.trackers[level]]
+        if not trackers:
+            return lambda entity, day, mask: True
+        if len(trackers) == 1:
+            return trackers[0].free
+        return lambda entity, day, mask: all(tr.free(entity, day, mask) for tr in trackers)
+
+    def scanner(self, level: str) -> Callable[[List[int], int, int], int]:
+        # first_free(entities, day, mask) for one level: index of the first
+        # entity every tracker accepts, -1 if none
+        trackers = [tr for _, tr in self.trackers[level]]
+        if len(trackers) == 1:
+            return trackers[0].first_free
+
+        def first_free(entities, day, mask):
+            for i, entity in enumerate(entities):
+                if all(tr.free(entity, day, mask) for tr in trackers):
+                    return i
+            return -1
+        return first_free
+
+    def book(self, class_id: int, teacher_id: int, room_id: int, day: int, mask: int) -> None:
+        for level, entity in (("class", class_id), ("teacher", teacher_id), ("room", room_id)):
+            for _, tr in self.trackers[level]:
+                tr.book(entity, day, mask)
+
+    def violation(self, class_id: int, subject_id: int, teacher_id: int, room_id: int,
+                  day: int, mask: int) -> Optional[Constraint]:
+        # the first constraint refusing this one placement, if any
+        p = self.problem
+        capacity = dict(p.rooms).get(room_id, 0)
+        for con in self.constraints:
+            if not con.teachers(p, class_id, subject_id, [teacher_id]):
+                return con
+            if not con.rooms(p, class_id, [(room_id, capacity)]):
+                return con
+        for level, entity in (("class", class_id), ("teacher", teacher_id), ("room", room_id)):
+            for con, tr in self.trackers[level]:
+                if not tr.free(entity, day, mask):
+                    return con
+        return None
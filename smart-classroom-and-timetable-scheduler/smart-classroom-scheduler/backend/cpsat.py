@@ -0,0 +1,78 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
+
+from constraints import Choice, Constraint, Search
+from problem import Problem, Placement, block_mask, mask_slots
+
+def solve_cpsat(problem: Problem, time_limit: float = 10.0, seed: int = 42, workers: int = 1,
+                constraints: Optional[List[Constraint]] = None) -> Tuple[List[Placement], Dict[str, int]]:
+    # OR-Tools is optional: only needed when this engine is selected
+    try:
+        from ortools.sat.python import cp_model
+    except ImportError as e:
+        raise RuntimeError("The cpsat engine needs OR-Tools (pip install ortools)") from e
+
+    model = cp_model.CpModel()
+    day_slots = problem.day_slots()
+    day_masks = problem.day_masks()
+    blocks = problem.blocks()
+
+    # One boolean per (block, start, teacher, room) that is feasible on its own:
+    # the block fits in the day and the teacher and room pass the registry's
+    # candidate pruning (qualification, capacity, ...)
+    search = Search(problem, constraints)
+    choices: List[Choice] = []
+    by_block = defaultdict(list)
+
+    for i, b in enumerate(blocks):
+        rooms = [r_id for r_id, _ in search.rooms(b.class_id)]
+        teachers = search.teachers(b.class_id, b.subject_id)
+        for day, slots in day_slots.items():
+            for slot in slots:
+                mask = block_mask(slot, b.length)
+                if mask & day_masks[day] != mask:
+                    continue
+                covered = [slots[s] for s in mask_slots(mask)]
+                for t_id in teachers:
+                    for r_id in rooms:
+                        x = model.NewBoolVar(f"b{i}_d{day}_s{slot}_t{t_id}_r{r_id}")
+                        choices.append(Choice(x, i, b.class_id, b.subject_id, day, mask, covered, t_id, r_id))
+                        by_block[i].append(x)
+
+    # Each block is placed at most once, as a whole
+    for xs in by_block.values():
+        model.AddAtMostOne(xs)
+    # Everything else (no teacher / room / class double-booking, ...) is
+    # encoded by the registered constraints
+    for con in search.constraints:
+        con.encode(model, problem, choices)
+
+    # Place as many periods as possible
+    model.Maximize(sum(blocks[ch.block].length * ch.var for ch in choices))
+
+    # Reproducible search: a fixed seed, a deterministic time budget instead of
+    # wall-clock (which depends on machine load), and interleaved rather than
+    # racing workers when more than one is used
+    solver = cp_model.CpSolver()
+    solver.parameters.random_seed = seed
+    solver.parameters.max_deterministic_time = time_limit
+    # wall-clock backstop for slow machines; a run that hits it isn't reproducible
+    solver.parameters.max_time_in_seconds = time_limit * 3
+    solver.parameters.num_workers = workers
+    if workers > 1:
+        solver.parameters.interleave_search = True
+    status = solver.Solve(model)
+
+    placements: List[Placement] = []
+    blocks_placed = 0
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        for ch in choices:
+            if not solver.Value(ch.var):
+                continue
+            for ts_id in ch.timeslots:
+                placements.append((ch.class_id, ts_id, ch.subject_id, ch.teacher_id, ch.room_id))
+            blocks_placed += 1
+
+    return placements, {"blocks_placed": blocks_placed, "blocks_needed": len(blocks),
+                        "attempts": solver.NumBranches(), "backtracks": solver.NumConflicts()}
@@ -1,17 +1,61 @@
 from __future__ import annotations
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./smart_classroom.db"
+import metrics
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = os.environ.get("SMART_CLASSROOM_DB", "sqlite:///./smart_classroom.db")
 
 Base = declarative_base()
 
+# SQLite runs in WAL mode, so readers never wait for a writer (or a writer
+# for readers). Writers still take turns; they wait at most BUSY_TIMEOUT for
+# the lock and then fail instead of queueing up.
+BUSY_TIMEOUT = 1.0  # seconds
+
+# The engine (and its connection pool) is created on first use rather than at
+# import, so importing the app or the models never opens the database
+_engine: Engine | None = None
+_Session = sessionmaker(autocommit=False, autoflush=False)
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        _engine = create_engine(
+            DATABASE_URL, connect_args={"check_same_thread": False, "timeout": BUSY_TIMEOUT}
+        )
+        _instrument(_engine)
+
+        @event.listens_for(_engine, "connect")
+        def _wal(dbapi_conn, record):
+            dbapi_conn.execute("PRAGMA journal_mode=WAL")
+    return _engine
+
+def _instrument(engine: Engine) -> None:
+    # Statement time by read/write into db_statement_seconds. SQLite makes a
+    # writer busy-wait for the lock inside its first write statement (and in
+    # COMMIT, timed as db_commit), so contention shows up in the write series;
+    # waits that exhaust the busy timeout are counted in db_locked_total.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        op = "read" if statement.lstrip()[:6].upper() == "SELECT" else "write"
+        metrics.observe("db_statement_seconds", time.perf_counter() - conn.info.pop("query_t0"), op=op)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        if "database is locked" in str(ctx.original_exception):
+            metrics.inc("db_locked_total")
+
+def SessionLocal() -> Session:
+    return _Session(bind=get_engine())
+
 def get_db():
     db = SessionLocal()
     try:
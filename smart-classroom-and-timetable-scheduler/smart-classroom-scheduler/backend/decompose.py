@@ -0,0 +1,139 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
+from dataclasses import replace
+import os
+
+from problem import Problem, Placement
+from scheduler import COUNTERS, SolveConfig, solve, solve_greedy
+
+# The chunking is fixed by the problem alone, never by the worker count, so a
+# decomposed solve gives the same timetable on any machine: enough chunks to
+# keep up to MIN_CHUNKS // 4 workers busy, more for large problems
+MIN_CHUNKS = 64
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]  # path halving
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[ra] = rb
+
+def components(problem: Problem) -> List[List[int]]:
+    # Classes are coupled when they may need the same teacher: connected
+    # components of the class <-> qualified-teacher graph. Rooms could be used
+    # by any class; they are dealt out between chunks in solve_decomposed.
+    uf = _UnionFind()
+    for c_id in problem.class_sizes:
+        uf.find(("c", c_id))
+    for c_id, s_id, _, _ in problem.requirements:
+        for t_id in problem.qual.get(s_id, []):
+            uf.union(("c", c_id), ("t", t_id))
+    # classes sharing students must be solved together too
+    for c_id, others in problem.conflicts.items():
+        for other in others:
+            uf.union(("c", c_id), ("c", other))
+
+    groups = defaultdict(list)
+    for c_id in problem.class_sizes:
+        groups[uf.find(("c", c_id))].append(c_id)
+    return sorted(groups.values(), key=len, reverse=True)
+
+def subproblem(problem: Problem, class_ids: List[int], rooms: List[Tuple[int, int]]) -> Problem:
+    keep = set(class_ids)
+    reqs = [r for r in problem.requirements if r[0] in keep]
+    subjects = {r[1] for r in reqs}
+    return Problem(
+        class_sizes={c_id: problem.class_sizes[c_id] for c_id in class_ids},
+        rooms=rooms,
+        timeslots=problem.timeslots,
+        qual={s_id: list(t_ids) for s_id, t_ids in problem.qual.items() if s_id in subjects},
+        requirements=reqs,
+        conflicts={c_id: problem.conflicts[c_id] for c_id in class_ids if c_id in problem.conflicts},
+    )
+
+def _chunks(groups: List[List[int]], n: int) -> List[List[int]]:
+    # Pack components into n roughly equal chunks (largest first) so tiny
+    # components don't each pay for a round trip to a worker process
+    bins: List[List[int]] = [[] for _ in range(max(1, min(n, len(groups))))]
+    for g in groups:
+        min(bins, key=len).extend(g)
+    return [b for b in bins if b]
+
+def _solve_part(args):
+    problem, config = args
+    return solve(problem, config)
+
+def _share_rooms(rooms: List[Tuple[int, int]], chunks: List[List[int]]) -> List[List[Tuple[int, int]]]:
+    # Deal rooms (small to large) to the chunk with the fewest rooms per class,
+    # so every chunk gets a slice of the whole capacity range and chunks never
+    # compete for a room while solving
+    shares: List[List[Tuple[int, int]]] = [[] for _ in chunks]
+    for room in rooms:
+        i = min(range(len(chunks)), key=lambda i: len(shares[i]) / len(chunks[i]))
+        shares[i].append(room)
+    return shares
+
+def solve_decomposed(problem: Problem, config: Optional[SolveConfig] = None) -> Tuple[List[Placement], Dict[str, int]]:
+    config = config or SolveConfig(decompose=True)
+    groups = components(problem)
+    workers = config.workers or os.cpu_count() or 1
+    # Enough chunks to keep the workers busy and each chunk small (the greedy
+    # room scan is linear in the chunk's rooms), but not one process round trip
+    # per tiny component
+    n_chunks = max(MIN_CHUNKS, len(problem.class_sizes) // 50)
+    chunks = _chunks(groups, n_chunks)
+    parts = [subproblem(problem, chunk, rooms)
+             for chunk, rooms in zip(chunks, _share_rooms(problem.rooms, chunks))]
+
+    # Every part is solved with the same single-worker config and results are
+    # merged in part order, so the outcome doesn't depend on which process
+    # finished first, nor on how many processes there were.
+    part_config = replace(config, decompose=False, workers=1)
+    if workers > 1 and len(parts) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as pool:
+            solved = list(pool.map(_solve_part, [(p, part_config) for p in parts]))
+    else:
+        solved = [_solve_part((p, part_config)) for p in parts]
+    merged: List[Placement] = [pl for placements, _ in solved for pl in placements]
+    # worker processes can't report metrics themselves; sum their counters
+    counters = defaultdict(int)
+    for _, extra in solved:
+        for k in COUNTERS:
+            counters[k] += extra.get(k, 0)
+
+    # Reconcile at the boundary: chunks never share classes, teachers or rooms,
+    # so their schedules merge as-is. What a chunk could not place (e.g. it was
+    # dealt no room big enough, or ran out of room-slots) is re-placed around
+    # the merged schedule by the greedy engine with the full room list.
+    placed_count = defaultdict(int)
+    for c_id, _, s_id, _, _ in merged:
+        placed_count[(c_id, s_id)] += 1
+    residual = [(c_id, s_id, periods - placed_count[(c_id, s_id)], length)
+                for c_id, s_id, periods, length in problem.requirements
+                if periods > placed_count[(c_id, s_id)]]
+    repaired: List[Placement] = []
+    if residual:
+        rest = Problem(problem.class_sizes, problem.rooms, problem.timeslots, problem.qual, residual,
+                       problem.conflicts)
+        repaired, extra = solve_greedy(rest, occupied=merged, rng=config.rng())
+        for k in COUNTERS:
+            counters[k] += extra.get(k, 0)
+
+    return merged + repaired, {
+        "components": len(groups),
+        "parts": len(parts),
+        "workers": workers,
+        "repaired": len(repaired),
+        **counters,
+    }
@@ -0,0 +1,108 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session, aliased
+
+from models import ClassGroup, Enrollment, Student
+
+# Course-conflict graph from student enrollments.
+#
+# With E the sparse students x classes enrollment matrix, E^T E is the
+# classes x classes matrix of shared students: an edge (a, b, n) means n
+# students are in both a and b, so the two may never be taught in the same
+# slot. Built as one sparse product, so thousands of students over hundreds
+# of electives take milliseconds, and only classes that actually share
+# students get an edge.
+
+def conflict_edges(student_ids: np.ndarray, class_ids: np.ndarray) -> np.ndarray:
+    # (e, 3) int64 rows (class_a, class_b, shared students) with a < b
+    if not len(student_ids):
+        return np.empty((0, 3), dtype=np.int64)
+    from scipy import sparse  # only needed once enrollments exist
+
+    students, s_idx = np.unique(student_ids, return_inverse=True)
+    classes, c_idx = np.unique(class_ids, return_inverse=True)
+    e = sparse.csr_matrix((np.ones(len(s_idx), dtype=np.int32), (s_idx, c_idx)),
+                          shape=(len(students), len(classes)))
+    e.sum_duplicates()
+    e.data[:] = 1
+    shared = sparse.triu(e.T @ e, k=1).tocoo()
+    return np.column_stack([classes[shared.row], classes[shared.col], shared.data]).astype(np.int64)
+
+def load_edges(db: Session) -> np.ndarray:
+    rows = np.array(db.query(Enrollment.student_id, Enrollment.class_id).all(), dtype=np.int64).reshape(-1, 2)
+    return conflict_edges(rows[:, 0], rows[:, 1])
+
+def neighbours(db: Session, class_id: int) -> List[int]:
+    # the classes sharing at least one student with class_id, read from that
+    # class's enrollments only (for checking a single placement)
+    other = aliased(Enrollment)
+    rows = (db.query(other.class_id).distinct()
+            .join(Enrollment, Enrollment.student_id == other.student_id)
+            .filter(Enrollment.class_id == class_id, other.class_id != class_id))
+    return sorted(c for c, in rows)
+
+def _student_ids(db: Session, names: List[str]) -> Dict[str, int]:
+    # name -> id, creating students that don't exist yet
+    ids = dict(db.query(Student.name, Student.id).filter(Student.name.in_(set(names))).all())
+    new = [Student(name=n) for n in dict.fromkeys(names) if n not in ids]
+    if new:
+        db.add_all(new)
+        db.flush()
+        ids.update((s.name, s.id) for s in new)
+    return ids
+
+def set_class_students(db: Session, class_id: int, names: List[str]) -> int:
+    # replace the enrollment of one class
+    ids = _student_ids(db, names)
+    db.query(Enrollment).filter(Enrollment.class_id == class_id).delete()
+    if names:
+        db.execute(Enrollment.__table__.insert(),
+                   [{"student_id": ids[n], "class_id": class_id} for n in dict.fromkeys(names)])
+    db.commit()
+    return len(set(names))
+
+def import_pairs(db: Session, pairs: List[Tuple[str, str]]) -> int:
+    # (student name, class name) rows; the classes named are re-enrolled from scratch
+    classes = dict(db.query(ClassGroup.name, ClassGroup.id).all())
+    unknown = sorted({c for _, c in pairs if c not in classes})
+    if unknown:
+        raise ValueError(f"unknown classes: {', '.join(unknown)}")
+    ids = _student_ids(db, [s for s, _ in pairs])
+    rows = {(ids[s], classes[c]) for s, c in pairs}
+    db.query(Enrollment).filter(Enrollment.class_id.in_({c for _, c in rows})).delete()
+    if rows:
+        db.execute(Enrollment.__table__.insert(), [{"student_id": s, "class_id": c} for s, c in sorted(rows)])
+    db.commit()
+    return len(rows)
+
+def adjacency(edges: np.ndarray) -> Dict[int, List[int]]:
+    # class_id -> classes sharing at least one student with it
+    out: Dict[int, List[int]] = defaultdict(list)
+    for a, b in edges[:, :2].tolist():
+        out[a].append(b)
+        out[b].append(a)
+    return dict(out)
+
+def cliques(adj: Dict[int, List[int]]) -> List[List[int]]:
+    # Greedy edge cover by cliques, largest-degree vertices first. Pairwise
+    # "not at the same time" constraints become one at-most-one per clique
+    # and timeslot, which is what keeps the CP-SAT encoding small. Cliques
+    # grow only along edges not yet covered, so every edge is covered once.
+    uncovered = {v: set(ns) for v, ns in adj.items()}
+    out: List[List[int]] = []
+    for v in sorted(adj, key=lambda v: -len(adj[v])):
+        while uncovered[v]:
+            u = min(uncovered[v])
+            clique = [v, u]
+            candidates = uncovered[v] & uncovered[u]
+            while candidates:
+                w = min(candidates)
+                clique.append(w)
+                candidates &= uncovered[w]
+            for x in clique:
+                uncovered[x].difference_update(clique)
+            out.append(clique)
+    return out
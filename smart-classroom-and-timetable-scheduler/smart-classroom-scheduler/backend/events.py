@@ -0,0 +1,105 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+import asyncio
+import json
+import threading
+
+from sqlalchemy.orm import Session
+
+import versions
+from models import TimeSlot
+
+# Server-sent schedule updates.
+#
+# Every time the live schedule changes (generate, clear, override, version
+# activation) versions.py reports the changed (class, timeslot) cells. They are
+# turned into compact per-cell deltas and pushed to every open
+# /api/schedule/events stream, filtered to the class each client is viewing:
+#
+#   event: cells
+#   data: {"version_id": 7, "cells": [[class_id, day, slot, subject_id, teacher_id, room_id], ...]}
+#
+# A removed cell is sent as [class_id, day, slot, null, null, null]. A client
+# that falls too far behind gets a single "resync" event and should refetch.
+# Subscribers live in this process only; with several workers, each worker
+# serves the changes made through it, so a client always refetches after its
+# own writes rather than waiting for them on its stream.
+
+QUEUE_SIZE = 256
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, class_id: Optional[int]):
+        self.loop = loop
+        self.class_id = class_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def offer(self, message: str) -> None:
+        # runs on the subscriber's event loop
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait("event: resync\ndata: {}\n\n")
+            return
+        self.queue.put_nowait(message)
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+
+    def subscribe(self, class_id: Optional[int] = None) -> _Subscriber:
+        sub = _Subscriber(asyncio.get_running_loop(), class_id)
+        with self._lock:
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+
+    def publish(self, version_id: int, cells: List[list]) -> None:
+        # thread-safe: endpoints run in the threadpool, subscribers on the loop
+        with self._lock:
+            subscribers = list(self._subscribers)
+        encoded: Dict[Optional[int], str] = {}
+        for sub in subscribers:
+            if sub.class_id not in encoded:
+                mine = cells if sub.class_id is None else [c for c in cells if c[0] == sub.class_id]
+                encoded[sub.class_id] = (f"event: cells\ndata: "
+                                         f"{json.dumps({'version_id': version_id, 'cells': mine}, separators=(',', ':'))}\n\n"
+                                         if mine else "")
+            if encoded[sub.class_id]:
+                sub.loop.call_soon_threadsafe(sub.offer, encoded[sub.class_id])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+broker = Broker()
+
+def _on_schedule_change(db: Session, version_id: int, changes: List[versions.Change]) -> None:
+    if not changes or not len(broker):
+        return
+    slot_of = {ts_id: (day, slot) for ts_id, day, slot in db.query(TimeSlot.id, TimeSlot.day, TimeSlot.slot)}
+    cells = []
+    for (c_id, ts_id), _, new in changes:
+        day, slot = slot_of[ts_id]
+        cells.append([c_id, day, slot, *(new or (None, None, None))])
+    broker.publish(version_id, cells)
+
+versions.on_change(_on_schedule_change)
+
+async def stream(request, class_id: Optional[int] = None, heartbeat: float = 15.0):
+    sub = broker.subscribe(class_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"  # keeps proxies from closing an idle stream
+    finally:
+        broker.unsubscribe(sub)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+import csv
+import io
+import os
+import re
+import tempfile
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from db import get_engine
+from models import Assignment, ClassGroup, Subject, Teacher, Room, TimeSlot, ScheduleState
+
+# Timetable exports (CSV, iCalendar, printable HTML).
+#
+# An export runs inside one read transaction: the active version id is read
+# first, and in WAL mode every later read on that connection sees the same
+# snapshot, so the live cells streamed afterwards are exactly that version's
+# (the live table and the active pointer are only ever changed together).
+# The cells come from a single ordered, joined SELECT and pass through a
+# chain of generators, so memory stays flat with the size of the document
+# apart from the current output batch (and, for HTML, the current table).
+# Finished exports are kept on disk per version: the stream is teed into a
+# temp file that becomes the cache entry once the stream completes. The
+# CACHE_ENTRIES most recently used entries are kept, since an older version
+# can be activated again; the rest are evicted.
+
+CACHE_DIR = Path(os.environ.get("SMART_CLASSROOM_EXPORT_CACHE",
+                                Path(__file__).resolve().parent / "export_cache"))
+FORMATS = {"csv": "text/csv; charset=utf-8",
+           "ics": "text/calendar; charset=utf-8",
+           "html": "text/html; charset=utf-8"}
+BATCH = 1000
+CACHE_ENTRIES = int(os.environ.get("SMART_CLASSROOM_EXPORT_CACHE_ENTRIES", 256))
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def snapshot() -> Tuple[Connection, int]:
+    # -> (a connection holding an open read transaction, the active version
+    # id as of that transaction). The caller hands the connection to stream()
+    # or closes it.
+    conn = get_engine().connect()
+    try:
+        conn.exec_driver_sql("BEGIN")
+        version_id = conn.execute(select(ScheduleState.active_version_id)
+                                  .where(ScheduleState.id == 1)).scalar_one()
+    except Exception:
+        conn.close()
+        raise
+    return conn, version_id
+
+def _rows(conn: Connection, by: str, entity_id: Optional[int]):
+    # (class_id, class, day, slot, label, subject, teacher_id, teacher, room),
+    # grouped by class (or teacher) and in day/slot order within a group
+    key = Assignment.teacher_id if by == "teacher" else Assignment.class_id
+    stmt = (select(Assignment.class_id, ClassGroup.name, TimeSlot.day, TimeSlot.slot, TimeSlot.label,
+                   Subject.name, Assignment.teacher_id, Teacher.name, Room.name)
+            .join(ClassGroup, ClassGroup.id == Assignment.class_id)
+            .join(TimeSlot, TimeSlot.id == Assignment.timeslot_id)
+            .join(Subject, Subject.id == Assignment.subject_id)
+            .join(Teacher, Teacher.id == Assignment.teacher_id)
+            .join(Room, Room.id == Assignment.room_id)
+            .order_by(key, TimeSlot.day, TimeSlot.slot))
+    if entity_id is not None:
+        stmt = stmt.where(key == entity_id)
+    return conn.execution_options(yield_per=BATCH).execute(stmt)
+
+def _batched(lines: Iterable[str], size: int = BATCH) -> Iterator[bytes]:
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= size:
+            yield "".join(buf).encode("utf-8")
+            buf.clear()
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+# ---------- CSV ----------
+def _csv_lines(rows) -> Iterator[str]:
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(["class", "day", "slot", "time", "subject", "teacher", "room"])
+    for c_id, c_name, day, slot, label, subject, t_id, teacher, room in rows:
+        w.writerow([c_name, DAY_NAMES[day], slot + 1, label, subject, teacher, room])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+# ---------- iCalendar ----------
+def _ics_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _times(label: str):
+    m = re.match(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})", label or "")
+    if not m:
+        return None
+    h1, m1, h2, m2 = map(int, m.groups())
+    return (h1, m1), (h2, m2)
+
+def _ics_lines(rows, term_start: date, version_id: int) -> Iterator[str]:
+    # One weekly-recurring event per timetable cell, in floating local time
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Smart Classroom//Timetable//EN\r\nCALSCALE:GREGORIAN\r\n"
+    for c_id, c_name, day, slot, label, subject, t_id, teacher, room in rows:
+        times = _times(label)
+        if times is None:
+            continue
+        d = term_start + timedelta(days=day)
+        (h1, m1), (h2, m2) = times
+        yield (
+            "BEGIN:VEVENT\r\n"
+            f"UID:c{c_id}-d{day}-s{slot}-v{version_id}@smart-classroom\r\n"
+            f"DTSTAMP:{stamp}\r\n"
+            f"DTSTART:{d:%Y%m%d}T{h1:02d}{m1:02d}00\r\n"
+            f"DTEND:{d:%Y%m%d}T{h2:02d}{m2:02d}00\r\n"
+            "RRULE:FREQ=WEEKLY\r\n"
+            f"SUMMARY:{_ics_text(subject)} ({_ics_text(c_name)})\r\n"
+            f"LOCATION:{_ics_text(room)}\r\n"
+            f"DESCRIPTION:{_ics_text(teacher)}\r\n"
+            "END:VEVENT\r\n"
+        )
+    yield "END:VCALENDAR\r\n"
+
+# ---------- Printable HTML ----------
+def _esc(value) -> str:
+    return (str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            .replace('"', "&quot;"))
+
+def _html_lines(rows, by: str) -> Iterator[str]:
+    # One page-broken table per class (or teacher). Rows arrive grouped by that
+    # key, so only the current group is ever held in memory.
+    yield ("<!doctype html><html><head><meta charset=\"utf-8\"><title>Timetable</title><style>"
+           "body{font-family:sans-serif}section{page-break-after:always}"
+           "table{border-collapse:collapse;width:100%}td,th{border:1px solid #999;padding:4px;font-size:12px}"
+           "</style></head><body>")
+
+    def table(title, cells):
+        days = sorted({d for d, _ in cells})
+        slots = sorted({s for _, s in cells})
+        labels = {s: cells[(d, s)][0] for d, s in cells}
+        head = "".join(f"<th>{_esc(labels[s])}</th>" for s in slots)
+        body = "".join(
+            f"<tr><th>{DAY_NAMES[d]}</th>" + "".join(
+                f"<td>{'<br>'.join(_esc(x) for x in cells[(d, s)][1:])}</td>" if (d, s) in cells else "<td></td>"
+                for s in slots) + "</tr>"
+            for d in days)
+        return f"<section><h2>{_esc(title)}</h2><table><tr><th></th>{head}</tr>{body}</table></section>"
+
+    current, title, cells = None, None, {}
+    for c_id, c_name, day, slot, label, subject, t_id, teacher, room in rows:
+        key = t_id if by == "teacher" else c_id
+        if key != current:
+            if cells:
+                yield table(title, cells)
+            current, title, cells = key, (teacher if by == "teacher" else c_name), {}
+        other = c_name if by == "teacher" else teacher
+        cells[(day, slot)] = (label, subject, other, room)
+    if cells:
+        yield table(title, cells)
+    yield "</body></html>"
+
+# ---------- Entry point ----------
+def monday_of(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+def cache_path(version_id: int, fmt: str, by: str, entity_id: Optional[int], term_start: date) -> Path:
+    scope = f"{by}-{entity_id if entity_id is not None else 'all'}"
+    extra = f"-{term_start:%Y%m%d}" if fmt == "ics" else ""
+    return CACHE_DIR / f"v{version_id}-{scope}{extra}.{fmt}"
+
+def hit(path: Path) -> bool:
+    # A cache hit marks the entry as recently used; False if it is missing
+    # (never written, or evicted meanwhile)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _prune() -> None:
+    # Evict the least recently used entries beyond CACHE_ENTRIES
+    entries = []
+    for p in CACHE_DIR.iterdir():
+        if p.name.startswith("."):
+            continue  # a stream in progress
+        try:
+            entries.append((p.stat().st_mtime, p))
+        except FileNotFoundError:
+            pass
+    entries.sort(reverse=True)
+    for _, p in entries[CACHE_ENTRIES:]:
+        p.unlink(missing_ok=True)
+
+def stream(conn: Connection, version_id: int, fmt: str, by: str, entity_id: Optional[int],
+           term_start: date) -> Iterator[bytes]:
+    # Takes over a connection from snapshot() (version_id is the id read in
+    # it): the response body is produced after the request's dependencies
+    # have been torn down. The read transaction stays open while streaming;
+    # in WAL mode it blocks no writer.
+    target = cache_path(version_id, fmt, by, entity_id, term_start)
+    complete = False
+    tmp = None
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=f".{target.name}.", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            rows = _rows(conn, by, entity_id)
+            if fmt == "csv":
+                lines = _csv_lines(rows)
+            elif fmt == "ics":
+                lines = _ics_lines(rows, term_start, version_id)
+            else:
+                lines = _html_lines(rows, by)
+            for chunk in _batched(lines):
+                f.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        conn.close()
+        if complete:
+            os.replace(tmp, target)
+            _prune()
+        elif tmp is not None:
+            Path(tmp).unlink(missing_ok=True)
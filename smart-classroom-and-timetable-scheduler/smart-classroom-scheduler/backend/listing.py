@@ -0,0 +1,58 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import name_key
+
+# Reference lists (teachers, rooms, classes, ...) at district scale.
+#
+#   fields=id,name   only these columns are selected (id is always included)
+#   q=ma             case-insensitive name prefix, a range scan on the
+#                    indexed name_key column (the name case-folded in
+#                    Python, see models.py) rather than LIKE over every row
+#   after=ID&limit=N keyset pagination in id order: the next page starts
+#                    after the last id seen, so deep pages cost the same as
+#                    the first (no OFFSET scans)
+# Rows come back as plain dicts straight from the selected columns, without
+# building ORM objects.
+
+MAX_LIMIT = 1000
+
+def columns(model, fields: Optional[str], allowed: Sequence[str]) -> list:
+    if not fields:
+        names = list(allowed)
+    else:
+        names = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [n for n in names if n not in allowed]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)} (choose from {', '.join(allowed)})")
+        if "id" not in names:
+            names.insert(0, "id")
+    return [getattr(model, n) for n in dict.fromkeys(names)]
+
+def name_prefix(column, q: str):
+    # column holds name_key() of the name; every string starting with q
+    # sorts between q and q + the largest code point
+    q = name_key(q)
+    return (column >= q) & (column < q + "\U0010ffff")
+
+def page(db: Session, model, allowed: Sequence[str], fields: Optional[str] = None, q: Optional[str] = None,
+         after: Optional[int] = None, limit: Optional[int] = None,
+         where: Sequence = ()) -> Tuple[List[Dict[str, object]], Optional[int]]:
+    # (rows, id to pass as `after` for the next page, or None on the last one)
+    stmt = select(*columns(model, fields, allowed)).order_by(model.id)
+    if q:
+        if not hasattr(model, "name_key"):
+            raise ValueError("this list has no names to search")
+        stmt = stmt.where(name_prefix(model.name_key, q))
+    for cond in where:
+        stmt = stmt.where(cond)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    rows = [dict(r._mapping) for r in db.execute(stmt)]
+    next_after = rows[-1]["id"] if limit is not None and len(rows) == limit else None
+    return rows, next_after
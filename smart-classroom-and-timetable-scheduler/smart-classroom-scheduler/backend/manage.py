@@ -0,0 +1,131 @@
+from __future__ import annotations
+import argparse
+
+# One-time / offline jobs, kept out of the web server process.
+# Run from the backend directory:  python manage.py <command>
+
+def cmd_init_db(args):
+    import seed
+    seed.run()  # creates missing tables and columns, seeds demo data into an empty database
+    print("database ready")
+
+def cmd_build_frontend(args):
+    from pathlib import Path
+    import static_assets
+    src = Path(__file__).resolve().parent.parent / "frontend"
+    manifest = static_assets.build(src)
+    for url, entry in sorted(manifest.items()):
+        print(f"{url:<32} {', '.join(entry['encodings']) or '-'}")
+
+def cmd_dump_problem(args):
+    import problem_io
+    from db import SessionLocal
+    from problem import load_problem
+    db = SessionLocal()
+    try:
+        problem = load_problem(db)
+    finally:
+        db.close()
+    problem_io.save_problem(args.out, problem)
+    print(f"wrote {args.out}: {len(problem.class_sizes)} classes, {len(problem.rooms)} rooms, "
+          f"{len(problem.requirements)} requirements")
+
+def cmd_solve_file(args):
+    import time
+    import problem_io
+    from scheduler import SolveConfig, solve
+    if args.replay:
+        # rerun with the config recorded in an earlier solution and compare
+        expected, meta = problem_io.load_solution(args.replay)
+        config = SolveConfig(**meta["config"])
+    else:
+        config = SolveConfig(engine=args.engine, seed=args.seed, time_limit=args.time_limit,
+                             workers=args.workers, decompose=args.decompose)
+    t0 = time.perf_counter()
+    problem = problem_io.load_problem_file(args.problem)
+    t1 = time.perf_counter()
+    placements, stats = solve(problem, config)
+    t2 = time.perf_counter()
+    stats = {"placed": len(placements), "needed": problem.total_periods(), **stats,
+             "load_ms": round((t1 - t0) * 1000, 2), "solve_ms": round((t2 - t1) * 1000, 2)}
+    if args.out:
+        problem_io.save_solution(args.out, placements, {"config": config.as_dict(), "problem": args.problem,
+                                                        "stats": stats})
+    print(stats)
+    if args.replay:
+        same = sorted(placements) == sorted(expected)
+        print(f"replay of {args.replay}: {'identical' if same else 'DIFFERENT'}")
+        if not same:
+            raise SystemExit(1)
+
+def cmd_load_solution(args):
+    import problem_io
+    import versions
+    from db import SessionLocal
+    placements, meta = problem_io.load_solution(args.solution)
+    db = SessionLocal()
+    try:
+        v, _ = versions.save_state(db, versions.placements_state(placements),
+                                   args.name or f"loaded {args.solution}", activate=args.activate,
+                                   config=meta.get("config"))
+        print(f"version {v.id}: {v.size} assignments, {v.changed} changed"
+              f"{' (active)' if args.activate else ''}")
+    finally:
+        db.close()
+
+def cmd_import_enrollments(args):
+    import csv
+    import enrollment
+    from db import SessionLocal
+    with open(args.csv, newline="", encoding="utf-8") as f:
+        pairs = [(row["student"].strip(), row["class"].strip()) for row in csv.DictReader(f)]
+    db = SessionLocal()
+    try:
+        n = enrollment.import_pairs(db, pairs)
+        edges = enrollment.load_edges(db)
+    except ValueError as e:
+        raise SystemExit(f"{args.csv}: {e}")
+    finally:
+        db.close()
+    print(f"{n} enrollments; {len(edges)} pairs of classes share students")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="manage.py")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init-db", help="create tables and seed demo data if empty")
+    p.set_defaults(func=cmd_init_db)
+
+    p = sub.add_parser("build-frontend", help="fingerprint and precompress the frontend into frontend/dist")
+    p.set_defaults(func=cmd_build_frontend)
+
+    p = sub.add_parser("dump-problem", help="write the scheduling problem in the database to a binary file")
+    p.add_argument("out")
+    p.set_defaults(func=cmd_dump_problem)
+
+    p = sub.add_parser("solve-file", help="solve a problem file offline")
+    p.add_argument("problem")
+    p.add_argument("--engine", default="greedy")
+    p.add_argument("--decompose", action="store_true")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--time-limit", type=float, default=10.0)
+    p.add_argument("--replay", metavar="SOL", help="re-solve with the config recorded in SOL and compare")
+    p.add_argument("--out", help="solution file to write")
+    p.set_defaults(func=cmd_solve_file)
+
+    p = sub.add_parser("load-solution", help="store a solution file as a schedule version")
+    p.add_argument("solution")
+    p.add_argument("--name")
+    p.add_argument("--activate", action="store_true", help="also make it the live schedule")
+    p.set_defaults(func=cmd_load_solution)
+
+    p = sub.add_parser("import-enrollments", help="load student enrollments from a CSV with student,class columns")
+    p.add_argument("csv")
+    p.set_defaults(func=cmd_import_enrollments)
+
+    args = ap.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
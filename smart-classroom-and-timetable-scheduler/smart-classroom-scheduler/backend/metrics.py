@@ -0,0 +1,102 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Dict, Tuple
+import threading
+import time
+
+# In-process metrics rendered in the Prometheus text format at /metrics.
+# Counters are plain sums; timings are histograms over fixed buckets.
+# Hot loops should count locally and report once, not call inc() per step.
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[Labels, float]] = {}
+_histograms: Dict[str, Dict[Labels, list]] = {}  # name -> labels -> [bucket counts..., count, sum]
+
+def _labels(labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+def observe(name: str, seconds: float, **labels) -> None:
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        h = series.get(key)
+        if h is None:
+            h = series[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+        h[-2] += 1
+        h[-1] += seconds
+
+@contextmanager
+def span(name: str, **labels):
+    # Times the block into the <name>_seconds histogram
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f"{name}_seconds", time.perf_counter() - t0, **labels)
+
+def _fmt(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for name in sorted(_counters):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(_counters[name].items()):
+                lines.append(f"{name}{_fmt(labels)} {value:g}")
+        for name in sorted(_histograms):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in sorted(_histograms[name].items()):
+                for bound, n in zip(BUCKETS, h):
+                    lines.append(f"{name}_bucket{_fmt(labels, (('le', f'{bound:g}'),))} {n}")
+                lines.append(f"{name}_bucket{_fmt(labels, (('le', '+Inf'),))} {h[-2]}")
+                lines.append(f"{name}_count{_fmt(labels)} {h[-2]}")
+                lines.append(f"{name}_sum{_fmt(labels)} {h[-1]:.6f}")
+    return "\n".join(lines) + "\n"
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+class TimingMiddleware:
+    # Pure ASGI middleware: per-endpoint request counts and latency, labelled
+    # with the route template (not the raw path) to keep cardinality bounded
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "/"
+            observe("http_request_seconds", time.perf_counter() - t0, method=scope["method"], route=path)
+            inc("http_requests_total", method=scope["method"], route=path, status=status["code"])
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from typing import List
+
+from sqlalchemy import bindparam, inspect, select, text
+from sqlalchemy.engine import Engine
+
+import models  # noqa: F401  (registers every table on Base.metadata)
+from db import Base
+
+# In-place schema upgrades for databases created by older versions.
+#
+# create_all only creates missing tables. Columns added to existing tables
+# since then are added here with ALTER TABLE ... ADD COLUMN (using the
+# model's default for rows already there), and missing indexes are created.
+# Every step checks the live schema first, so running it again is a no-op.
+#
+# Triggers bump schedule_state.reference_revision on every write to the tables
+# that schedule summaries are computed from, whoever writes them, so a cache
+# can be keyed on that one value instead of on the tables' contents.
+
+# expression indexes on lower(name), replaced by the name_key columns
+OBSOLETE_INDEXES = ["ix_teachers_name_lower", "ix_subjects_name_lower",
+                    "ix_class_groups_name_lower", "ix_rooms_name_lower"]
+REFERENCE_TABLES = ["rooms", "teachers", "class_groups", "timeslots"]
+
+def _literal(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def upgrade(engine: Engine) -> List[str]:
+    # -> the statements applied
+    Base.metadata.create_all(bind=engine)
+    insp = inspect(engine)
+    applied = []
+    with engine.begin() as conn:
+        indexes = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=engine.dialect)}"
+                default = col.default.arg if col.default is not None and col.default.is_scalar else None
+                if default is not None:
+                    ddl += f"{'' if col.nullable else ' NOT NULL'} DEFAULT {_literal(default)}"
+                conn.execute(text(ddl))
+                applied.append(ddl)
+            if "name_key" in table.c:
+                # rows written before the column, or by older code
+                rows = conn.execute(select(table.c.id, table.c.name).where(table.c.name_key.is_(None))).all()
+                if rows:
+                    conn.execute(table.update().where(table.c.id == bindparam("row_id"))
+                                 .values(name_key=bindparam("key")),
+                                 [{"row_id": i, "key": models.name_key(n)} for i, n in rows])
+                    applied.append(f"UPDATE {table.name} SET name_key ({len(rows)} rows)")
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    applied.append(f"CREATE INDEX {index.name}")
+        triggers = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+        for table in REFERENCE_TABLES:
+            for op in ("insert", "update", "delete"):
+                name = f"trg_{table}_{op}_reference_revision"
+                if name not in triggers:
+                    conn.execute(text(f"CREATE TRIGGER {name} AFTER {op.upper()} ON {table} BEGIN "
+                                      "UPDATE schedule_state SET reference_revision = reference_revision + 1 "
+                                      "WHERE id = 1; END"))
+                    applied.append(f"CREATE TRIGGER {name}")
+        for name in OBSOLETE_INDEXES:
+            if name in indexes:
+                conn.execute(text(f"DROP INDEX {name}"))
+                applied.append(f"DROP INDEX {name}")
+    return applied
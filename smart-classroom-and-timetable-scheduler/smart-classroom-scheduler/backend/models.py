@@ -1,16 +1,36 @@
 from __future__ import annotations
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from sqlalchemy import String, Integer, Boolean, ForeignKey, UniqueConstraint, LargeBinary, DateTime, Date
 from typing import List, Optional
+from datetime import date, datetime
 from db import Base  # Changed from .db import Base to db import Base
 
-class Teacher(Base):
+# Case-insensitive name-prefix search on the reference lists (see listing.py)
+# runs as a range scan on an indexed, case-folded copy of the name. Folding
+# is done in Python: SQLite's lower() only folds ASCII, so "Émile" would
+# never match "é". Set by the ORM when the name is assigned, and by the
+# column default for Core inserts.
+def name_key(name: str) -> str:
+    return name.casefold()
+
+def _name_key_default(ctx) -> str:
+    return name_key(ctx.get_current_parameters()["name"])
+
+class NameKey:
+    name_key: Mapped[Optional[str]] = mapped_column(String, nullable=True, index=True, default=_name_key_default)
+
+    @validates("name")
+    def _fold_name(self, key, value):
+        self.name_key = name_key(value) if value is not None else None
+        return value
+
+class Teacher(NameKey, Base):
     __tablename__ = "teachers"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String, unique=True)
     subjects: Mapped[list["TeacherSubject"]] = relationship(back_populates="teacher", cascade="all, delete-orphan")
 
-class Subject(Base):
+class Subject(NameKey, Base):
     __tablename__ = "subjects"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String, unique=True)
@@ -25,13 +45,27 @@ class TeacherSubject(Base):
 
     __table_args__ = (UniqueConstraint("teacher_id", "subject_id", name="uq_teacher_subject"),)
 
-class ClassGroup(Base):
+class ClassGroup(NameKey, Base):
     __tablename__ = "class_groups"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String, unique=True)
     size: Mapped[int] = mapped_column(Integer, default=30)
 
-class Room(Base):
+class Student(Base):
+    __tablename__ = "students"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, unique=True)
+
+class Enrollment(Base):
+    # a student taking a class group (a form, or an elective course)
+    __tablename__ = "enrollments"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id"))
+    class_id: Mapped[int] = mapped_column(ForeignKey("class_groups.id"), index=True)
+
+    __table_args__ = (UniqueConstraint("student_id", "class_id", name="uq_student_class"),)
+
+class Room(NameKey, Base):
     __tablename__ = "rooms"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String, unique=True)
@@ -54,6 +88,7 @@ class SubjectRequirement(Base):
     class_id: Mapped[int] = mapped_column(ForeignKey("class_groups.id"))
     subject_id: Mapped[int] = mapped_column(ForeignKey("subjects.id"))
     periods_per_week: Mapped[int] = mapped_column(Integer)
+    block_length: Mapped[int] = mapped_column(Integer, default=1)  # consecutive periods per session (2 = double lesson/lab)
 
     __table_args__ = (UniqueConstraint("class_id", "subject_id", name="uq_class_subject"),)
 
@@ -67,3 +102,56 @@ class Assignment(Base):
     room_id: Mapped[int] = mapped_column(ForeignKey("rooms.id"))
 
     __table_args__ = (UniqueConstraint("class_id", "timeslot_id", name="uq_class_timeslot"),)
+
+class ScheduleVersion(Base):
+    __tablename__ = "schedule_versions"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String)
+    parent_id: Mapped[Optional[int]] = mapped_column(ForeignKey("schedule_versions.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    depth: Mapped[int] = mapped_column(Integer, default=0)    # distance to the root version
+    size: Mapped[int] = mapped_column(Integer, default=0)     # assignments in this version
+    changed: Mapped[int] = mapped_column(Integer, default=0)  # rows changed vs parent
+    delta: Mapped[bytes] = mapped_column(LargeBinary)         # packed changes vs parent (see versions.py)
+    snapshot: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)  # packed full state, every few levels
+    config: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # JSON solve config of generated versions
+
+class ScheduleState(Base):
+    __tablename__ = "schedule_state"
+    id: Mapped[int] = mapped_column(primary_key=True)  # single row, id=1
+    active_version_id: Mapped[Optional[int]] = mapped_column(ForeignKey("schedule_versions.id"), nullable=True)
+    revision: Mapped[int] = mapped_column(Integer, default=0)  # bumped by every change to the live schedule
+    reference_revision: Mapped[int] = mapped_column(Integer, default=0)  # bumped by triggers, see migrate.py
+
+class Term(Base):
+    __tablename__ = "terms"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, unique=True)
+    start: Mapped[date] = mapped_column(Date)  # Monday of week 0
+    weeks: Mapped[int] = mapped_column(Integer)
+    patterns: Mapped[list["TermPattern"]] = relationship(order_by="TermPattern.position", cascade="all, delete-orphan")
+
+class TermPattern(Base):
+    # week w of a term follows pattern w % len(patterns), e.g. A/B weeks
+    __tablename__ = "term_patterns"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    term_id: Mapped[int] = mapped_column(ForeignKey("terms.id"))
+    position: Mapped[int] = mapped_column(Integer)
+    version_id: Mapped[int] = mapped_column(ForeignKey("schedule_versions.id"))
+
+    __table_args__ = (UniqueConstraint("term_id", "position", name="uq_term_position"),)
+
+class WeekException(Base):
+    # one cell of one week replacing the pattern's; no subject = lesson cancelled
+    __tablename__ = "week_exceptions"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    term_id: Mapped[int] = mapped_column(ForeignKey("terms.id"), index=True)
+    week: Mapped[int] = mapped_column(Integer)
+    class_id: Mapped[int] = mapped_column(ForeignKey("class_groups.id"))
+    timeslot_id: Mapped[int] = mapped_column(ForeignKey("timeslots.id"))
+    subject_id: Mapped[Optional[int]] = mapped_column(ForeignKey("subjects.id"), nullable=True)
+    teacher_id: Mapped[Optional[int]] = mapped_column(ForeignKey("teachers.id"), nullable=True)
+    room_id: Mapped[Optional[int]] = mapped_column(ForeignKey("rooms.id"), nullable=True)
+    note: Mapped[str] = mapped_column(String, default="")
+
+    __table_args__ = (UniqueConstraint("term_id", "week", "class_id", "timeslot_id", name="uq_week_cell"),)
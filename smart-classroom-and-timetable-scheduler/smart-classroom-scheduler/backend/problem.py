@@ -0,0 +1,116 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from collections import defaultdict
+from sqlalchemy.orm import Session
+
+from enrollment import adjacency, load_edges, neighbours
+
+from models import (
+    Teacher, Subject, TeacherSubject, ClassGroup, Room, TimeSlot, SubjectRequirement
+)
+
+# (class_id, timeslot_id, subject_id, teacher_id, room_id)
+Placement = Tuple[int, int, int, int, int]
+
+@dataclass
+class Block:
+    class_id: int
+    subject_id: int
+    length: int  # consecutive periods, placed as one unit (same teacher + room)
+
+def block_mask(slot: int, length: int) -> int:
+    # bitmask of the slots [slot, slot+length) within one day
+    return ((1 << length) - 1) << slot
+
+def mask_slots(mask: int) -> List[int]:
+    out = []
+    i = 0
+    while mask:
+        if mask & 1:
+            out.append(i)
+        mask >>= 1
+        i += 1
+    return out
+
+@dataclass
+class Problem:
+    class_sizes: Dict[int, int]                     # class_id -> size
+    rooms: List[Tuple[int, int]]                    # (room_id, capacity), small to large
+    timeslots: List[Tuple[int, int, int]]           # (timeslot_id, day, slot), ordered
+    qual: Dict[int, List[int]]                      # subject_id -> teacher_ids
+    requirements: List[Tuple[int, int, int, int]]   # (class_id, subject_id, periods_per_week, block_length)
+    conflicts: Dict[int, List[int]] = field(default_factory=dict)  # class_id -> classes sharing students
+
+    def day_slots(self) -> Dict[int, Dict[int, int]]:
+        # day -> slot -> timeslot_id
+        out: Dict[int, Dict[int, int]] = defaultdict(dict)
+        for ts_id, day, slot in self.timeslots:
+            out[day][slot] = ts_id
+        return out
+
+    def day_masks(self) -> Dict[int, int]:
+        # day -> bitmask of the slots that exist on that day
+        return {day: sum(1 << s for s in slots) for day, slots in self.day_slots().items()}
+
+    def blocks(self) -> List[Block]:
+        # periods_per_week is split into as many full blocks as fit; the
+        # remainder (if any) is scheduled as single periods
+        out: List[Block] = []
+        for c_id, s_id, periods, length in self.requirements:
+            length = max(1, length or 1)
+            full, rest = divmod(periods, length)
+            out.extend(Block(c_id, s_id, length) for _ in range(full))
+            out.extend(Block(c_id, s_id, 1) for _ in range(rest))
+        return out
+
+    def total_periods(self) -> int:
+        return sum(r[2] for r in self.requirements)
+
+def load_problem(db: Session) -> Problem:
+    # every query is ordered: the solvers iterate these lists, so the same
+    # data must give the same Problem for a seeded run to replay exactly
+    qual = defaultdict(list)
+    for ts in db.query(TeacherSubject).order_by(TeacherSubject.id).all():
+        qual[ts.subject_id].append(ts.teacher_id)
+
+    return Problem(
+        class_sizes={c.id: c.size for c in db.query(ClassGroup).order_by(ClassGroup.id).all()},
+        rooms=sorted(((r.id, r.capacity) for r in db.query(Room).order_by(Room.id).all()),
+                     key=lambda r: r[1]),  # by capacity, ties by id
+        timeslots=[(t.id, t.day, t.slot) for t in
+                   db.query(TimeSlot).order_by(TimeSlot.day, TimeSlot.slot).all()],
+        qual=dict(qual),
+        requirements=[(r.class_id, r.subject_id, r.periods_per_week, r.block_length)
+                      for r in db.query(SubjectRequirement).order_by(SubjectRequirement.id).all()],
+        conflicts=adjacency(load_edges(db)),
+    )
+
+def load_placement(db: Session, class_id: int, subject_id: int, teacher_id: int, room_id: int,
+                   timeslot: Tuple[int, int, int]) -> Problem:
+    # The part of the problem one placement is checked against (an override
+    # or a week exception): the class size, the room capacity, whether the
+    # teacher is qualified for the subject and the classes sharing students
+    # with this one. A handful of indexed lookups instead of load_problem().
+    # KeyError names the first id that does not exist.
+    size = db.query(ClassGroup.size).filter(ClassGroup.id == class_id).scalar()
+    if size is None:
+        raise KeyError("class")
+    capacity = db.query(Room.capacity).filter(Room.id == room_id).scalar()
+    if capacity is None:
+        raise KeyError("room")
+    for model, entity_id, kind in ((Teacher, teacher_id, "teacher"), (Subject, subject_id, "subject")):
+        if db.query(model.id).filter(model.id == entity_id).first() is None:
+            raise KeyError(kind)
+    qualified = (db.query(TeacherSubject.id)
+                 .filter(TeacherSubject.teacher_id == teacher_id, TeacherSubject.subject_id == subject_id)
+                 .first()) is not None
+    near = neighbours(db, class_id)
+    return Problem(
+        class_sizes={class_id: size},
+        rooms=[(room_id, capacity)],
+        timeslots=[timeslot],
+        qual={subject_id: [teacher_id]} if qualified else {},
+        requirements=[],
+        conflicts={class_id: near, **{c: [class_id] for c in near}} if near else {},
+    )
@@ -0,0 +1,167 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from problem import Problem, Placement
+
+# Flat, memory-mappable container for problems and solutions.
+#
+#   header   magic "SCTP" | format version u32 | kind (8 ascii) | array count u32
+#   toc      per array: name (24 ascii) | dtype (8 ascii, e.g. "<i4") | ndim u32
+#            | shape (2 x u64) | offset u64 | nbytes u64
+#   data     arrays, each starting on a 64-byte boundary
+#
+# Readers map the file and wrap each array with np.frombuffer, so loading is
+# an mmap plus a header parse whatever the size; pages are read on first touch.
+#
+# A problem ("problem" kind) uses dense 0..n-1 indices for every entity, with
+# the database ids kept alongside:
+#   class_ids, class_size       (n_classes,)
+#   room_ids, room_capacity     (n_rooms,)        small to large
+#   teacher_ids                 (n_teachers,)
+#   subject_ids                 (n_subjects,)
+#   timeslots                   (n_timeslots, 3)  id, day, slot
+#   qual                        (n_pairs, 2)      subject idx, teacher idx
+#   requirements                (n_requirements, 4) class idx, subject idx, periods, block length
+#   conflicts                   (n_edges, 2)      class idx pairs sharing students (since version 2)
+# A solution ("solution" kind) holds
+#   placements                  (n, 5) class_id, timeslot_id, subject_id, teacher_id, room_id
+#   meta                        utf-8 JSON (engine, stats, ...)
+#
+# Adding an array bumps FORMAT_VERSION, so an older build refuses the file
+# instead of silently dropping data it doesn't know about. Files of earlier
+# versions still load; an array this build doesn't recognise is an error.
+
+MAGIC = b"SCTP"
+FORMAT_VERSION = 2
+ARRAYS = {
+    "problem": {"class_ids", "class_size", "room_ids", "room_capacity", "teacher_ids", "subject_ids",
+                "timeslots", "qual", "requirements", "conflicts"},
+    "solution": {"placements", "meta"},
+}
+ALIGN = 64
+_HEADER = struct.Struct("<4sI8sI")
+_ENTRY = struct.Struct("<24s8sIQQQQ")
+
+def write_arrays(path, kind: str, arrays: Dict[str, np.ndarray]) -> None:
+    arrays = {k: np.ascontiguousarray(v) for k, v in arrays.items()}
+    offset = _HEADER.size + _ENTRY.size * len(arrays)
+    entries, layout = [], []
+    for name, a in arrays.items():
+        offset = -(-offset // ALIGN) * ALIGN
+        shape = tuple(a.shape) + (0,) * (2 - a.ndim)
+        entries.append(_ENTRY.pack(name.encode(), a.dtype.str.encode(), a.ndim, shape[0], shape[1],
+                                   offset, a.nbytes))
+        layout.append((offset, a))
+        offset += a.nbytes
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, kind.encode(), len(arrays)))
+        for e in entries:
+            f.write(e)
+        for off, a in layout:
+            f.write(b"\0" * (off - f.tell()))
+            f.write(a.tobytes())
+
+def read_arrays(path) -> Tuple[str, Dict[str, np.ndarray]]:
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, kind, count = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a timetable problem/solution file")
+    if not 1 <= version <= FORMAT_VERSION:
+        raise ValueError(f"{path}: format version {version}, this build reads up to {FORMAT_VERSION}")
+    arrays = {}
+    for i in range(count):
+        name, dtype, ndim, s0, s1, offset, nbytes = _ENTRY.unpack_from(buf, _HEADER.size + i * _ENTRY.size)
+        shape = (s0, s1)[:ndim]
+        dt = np.dtype(dtype.rstrip(b"\0").decode())
+        if nbytes == 0:
+            a = np.empty(shape, dtype=dt)
+        else:
+            a = np.frombuffer(buf, dtype=dt, count=nbytes // dt.itemsize, offset=offset).reshape(shape)
+        arrays[name.rstrip(b"\0").decode()] = a
+    kind = kind.rstrip(b"\0").decode()
+    unknown = set(arrays) - ARRAYS.get(kind, set(arrays))
+    if unknown:
+        raise ValueError(f"{path}: unknown {kind} arrays: {', '.join(sorted(unknown))}")
+    return kind, arrays
+
+# ---------- Problems ----------
+def problem_arrays(problem: Problem) -> Dict[str, np.ndarray]:
+    class_ids = sorted(problem.class_sizes)
+    teacher_ids = sorted({t for ts in problem.qual.values() for t in ts})
+    subject_ids = sorted(set(problem.qual) | {r[1] for r in problem.requirements})
+    c_idx = {c: i for i, c in enumerate(class_ids)}
+    t_idx = {t: i for i, t in enumerate(teacher_ids)}
+    s_idx = {s: i for i, s in enumerate(subject_ids)}
+
+    # sparse (subject, teacher) pairs: a dense matrix grows with schools squared
+    qual = [(s_idx[s], t_idx[t]) for s, ts in problem.qual.items() for t in ts]
+    return {
+        "class_ids": np.array(class_ids, dtype=np.int32),
+        "class_size": np.array([problem.class_sizes[c] for c in class_ids], dtype=np.int32),
+        "room_ids": np.array([r for r, _ in problem.rooms], dtype=np.int32),
+        "room_capacity": np.array([cap for _, cap in problem.rooms], dtype=np.int32),
+        "teacher_ids": np.array(teacher_ids, dtype=np.int32),
+        "subject_ids": np.array(subject_ids, dtype=np.int32),
+        "timeslots": np.array(problem.timeslots, dtype=np.int32).reshape(-1, 3),
+        "qual": np.array(qual, dtype=np.int32).reshape(-1, 2),
+        "requirements": np.array([(c_idx[c], s_idx[s], n, length or 1)
+                                  for c, s, n, length in problem.requirements], dtype=np.int32).reshape(-1, 4),
+        "conflicts": np.array([(c_idx[a], c_idx[b]) for a, others in problem.conflicts.items()
+                               for b in others if a < b], dtype=np.int32).reshape(-1, 2),
+    }
+
+def problem_from_arrays(a: Dict[str, np.ndarray]) -> Problem:
+    # The engines work on plain Python containers; tolist() over the mapped
+    # arrays is the only copy made
+    class_ids = a["class_ids"]
+    teacher_ids = a["teacher_ids"].tolist()
+    subject_ids = a["subject_ids"]
+    qual = {}
+    pairs = a["qual"]
+    for s, t in zip(subject_ids[pairs[:, 0]].tolist(), pairs[:, 1].tolist()):
+        qual.setdefault(s, []).append(teacher_ids[t])
+    reqs = a["requirements"]
+    conflicts = {}
+    if "conflicts" in a:
+        pairs = class_ids[a["conflicts"]].tolist()
+        for x, y in pairs:
+            conflicts.setdefault(x, []).append(y)
+            conflicts.setdefault(y, []).append(x)
+    return Problem(
+        class_sizes=dict(zip(class_ids.tolist(), a["class_size"].tolist())),
+        rooms=list(zip(a["room_ids"].tolist(), a["room_capacity"].tolist())),
+        timeslots=[tuple(row) for row in a["timeslots"].tolist()],
+        qual=qual,
+        requirements=list(zip(class_ids[reqs[:, 0]].tolist(), subject_ids[reqs[:, 1]].tolist(),
+                              reqs[:, 2].tolist(), reqs[:, 3].tolist())),
+        conflicts=conflicts,
+    )
+
+def save_problem(path, problem: Problem) -> None:
+    write_arrays(path, "problem", problem_arrays(problem))
+
+def load_problem_file(path) -> Problem:
+    kind, arrays = read_arrays(path)
+    if kind != "problem":
+        raise ValueError(f"{path}: expected a problem file, got {kind}")
+    return problem_from_arrays(arrays)
+
+# ---------- Solutions ----------
+def save_solution(path, placements: List[Placement], meta: dict) -> None:
+    write_arrays(path, "solution", {
+        "placements": np.array(placements, dtype=np.int32).reshape(-1, 5),
+        "meta": np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+    })
+
+def load_solution(path) -> Tuple[List[Placement], dict]:
+    kind, arrays = read_arrays(path)
+    if kind != "solution":
+        raise ValueError(f"{path}: expected a solution file, got {kind}")
+    placements = [tuple(row) for row in arrays["placements"].tolist()]
+    return placements, json.loads(arrays["meta"].tobytes().decode("utf-8"))
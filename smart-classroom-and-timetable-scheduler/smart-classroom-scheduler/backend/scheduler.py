@@ -1,112 +1,166 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from collections import defaultdict
+from dataclasses import asdict, dataclass
 import random
 
-# Changed from .models import to models import
-from models import (
-    Teacher, Subject, TeacherSubject, ClassGroup, Room, TimeSlot,
-    SubjectRequirement, Assignment
-)
-
-@dataclass
-class Task:
-    class_id: int
-    subject_id: int
-    remaining: int
-
-def generate_schedule(db: Session) -> Dict[str, List[str]]:
-    # Clear old assignments
-    db.query(Assignment).delete()
-
-    teachers = {t.id: t for t in db.query(Teacher).all()}
-    subjects = {s.id: s for s in db.query(Subject).all()}
-    classes = {c.id: c for c in db.query(ClassGroup).all()}
-    rooms = sorted(db.query(Room).all(), key=lambda r: r.capacity)  # small to large
-    timeslots = db.query(TimeSlot).order_by(TimeSlot.day, TimeSlot.slot).all()
-
-    # qualifications: subject_id -> list of teacher_ids
-    qual = defaultdict(list)
-    for ts in db.query(TeacherSubject).all():
-        qual[ts.subject_id].append(ts.teacher_id)
-
-    # task list per class
-    tasks: List[Task] = []
-    reqs = db.query(SubjectRequirement).all()
-    for r in reqs:
-        tasks.append(Task(class_id=r.class_id, subject_id=r.subject_id, remaining=r.periods_per_week))
-
-    # State occupancy
-    teacher_busy = set()  # (teacher_id, timeslot_id)
-    room_busy = set()     # (room_id, timeslot_id)
-    class_busy = set()    # (class_id, timeslot_id)
-    class_subject_day_count = defaultdict(lambda: defaultdict(int))  # class_id -> (day,subject) -> count
-
-    # For simple heuristic, expand tasks into per-period items and shuffle by class
-    expanded: List[Tuple[int,int]] = []  # (class_id, subject_id)
-    for t in tasks:
-        expanded.extend([(t.class_id, t.subject_id)] * t.remaining)
+import metrics
+import versions
+from constraints import Constraint, Search
+from problem import Problem, Placement, load_problem, block_mask, mask_slots
+
+ENGINES = ("greedy", "cpsat")
+# per-solve counters engines report in their stats; exported as scheduler_<name>_total
+COUNTERS = ("attempts", "teacher_conflicts", "room_conflicts", "backtracks")
+DEFAULT_SEED = 42
+
+@dataclass(frozen=True)
+class SolveConfig:
+    # Everything that decides a solve's outcome. Recorded with every generated
+    # version, so rerunning with the same config on the same problem gives
+    # the same timetable.
+    engine: str = "greedy"
+    seed: int = DEFAULT_SEED
+    time_limit: float = 10.0        # cpsat, in deterministic time units (~seconds)
+    workers: Optional[int] = None   # decompose: worker processes; cpsat: search workers
+    decompose: bool = False
+
+    def __post_init__(self):
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{self.engine}', expected one of {', '.join(ENGINES)}")
+        if self.time_limit <= 0:
+            raise ValueError("time_limit must be positive")
+        if self.workers is not None and self.workers < 1:
+            raise ValueError("workers must be at least 1")
+
+    def rng(self) -> random.Random:
+        # a private generator per solve: no process-global random state, so
+        # solves can run side by side in threads
+        return random.Random(self.seed)
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+def solve_greedy(problem: Problem, occupied: Iterable[Placement] = (),
+                 rng: Optional[random.Random] = None,
+                 constraints: Optional[List[Constraint]] = None) -> Tuple[List[Placement], Dict[str, int]]:
+    rng = rng or random.Random(DEFAULT_SEED)
+    day_slots = problem.day_slots()
+    day_masks = problem.day_masks()
+
+    # Candidate pruning and occupancy come from the constraint registry; the
+    # built-in trackers keep per-day slot bitmasks, so a whole block is
+    # checked with a single AND instead of slot-by-slot lookups
+    search = Search(problem, constraints, occupied)
+    class_free = search.checker("class")
+    teacher_free = search.checker("teacher")
+    room_first_free = search.scanner("room")
+    class_rooms = {c_id: [r_id for r_id, _ in search.rooms(c_id)] for c_id in problem.class_sizes}
+    class_subject_day_count = defaultdict(int)  # (class_id, day, subject_id) -> periods
+
+    blocks = problem.blocks()
 
     # Spread sessions by interleaving classes and subjects
-    random.seed(42)
-    random.shuffle(expanded)
+    rng.shuffle(blocks)
 
+    pending = defaultdict(list)  # class_id -> [(subject_id, length)]
+    for b in blocks:
+        pending[b.class_id].append((b.subject_id, b.length))
+
+    placements: List[Placement] = []
+    blocks_placed = 0
+    # hot-path counters, reported once at the end
+    attempts = teacher_conflicts = room_conflicts = backtracks = 0
     # Greedy allocation over timeslots looping
-    # For each timeslot, try to assign one period for each class in turn
-    expanded_by_class = defaultdict(list)
-    for c_id, s_id in expanded:
-        expanded_by_class[c_id].append(s_id)
-
-    success_count = 0
-    for ts in timeslots:
-        for c_id in classes.keys():
-            if not expanded_by_class[c_id]:
+    # For each timeslot, try to start one block for each class in turn
+    for _, day, slot in problem.timeslots:
+        for c_id in problem.class_sizes:
+            if not pending[c_id]:
+                continue
+            if not class_free(c_id, day, 1 << slot):  # still inside an earlier block
                 continue
-            # choose a subject that we haven't taught too many times in this day to keep variety
-            candidate_subjects = list(set(expanded_by_class[c_id]))
-            # prefer subjects with lower count today
-            candidate_subjects.sort(key=lambda sid: class_subject_day_count[(c_id, ts.day, sid)])
+            # choose a subject that we haven't taught too many times in this day to keep variety,
+            # longer blocks first since they have fewer places to go
+            candidates = list(dict.fromkeys(pending[c_id]))
+            candidates.sort(key=lambda b: (class_subject_day_count[(c_id, day, b[0])], -b[1]))
             placed = False
-            for s_id in candidate_subjects:
+            for s_id, length in candidates:
+                mask = block_mask(slot, length)
+                if mask & day_masks[day] != mask:  # block runs past the end of the day
+                    continue
+                if not class_free(c_id, day, mask):
+                    continue
+                attempts += 1
                 # find a qualified free teacher
-                teacher_ids = qual.get(s_id, [])
-                random.shuffle(teacher_ids)
+                teacher_ids = list(search.teachers(c_id, s_id))  # don't reorder the cached list
+                rng.shuffle(teacher_ids)
                 for t_id in teacher_ids:
-                    if (t_id, ts.id) in teacher_busy:  # teacher conflict
+                    if not teacher_free(t_id, day, mask):  # teacher conflict
+                        teacher_conflicts += 1
                         continue
-                    # find first room that fits and is free
-                    for r in rooms:
-                        if r.capacity < classes[c_id].size:
-                            continue
-                        if (r.id, ts.id) in room_busy:
-                            continue
-                        if (c_id, ts.id) in class_busy:
-                            continue
-                        # place
-                        db.add(Assignment(
-                            class_id=c_id,
-                            timeslot_id=ts.id,
-                            subject_id=s_id,
-                            teacher_id=t_id,
-                            room_id=r.id
-                        ))
-                        teacher_busy.add((t_id, ts.id))
-                        room_busy.add((r.id, ts.id))
-                        class_busy.add((c_id, ts.id))
-                        class_subject_day_count[(c_id, ts.day, s_id)] += 1
-                        # consume one from the list
-                        expanded_by_class[c_id].remove(s_id)
-                        placed = True
-                        success_count += 1
-                        break
-                    if placed:
-                        break
+                    # find first room that fits and is free for the whole block
+                    room_ids = class_rooms[c_id]
+                    i = room_first_free(room_ids, day, mask)
+                    if i < 0:
+                        room_conflicts += len(room_ids)
+                        continue
+                    room_conflicts += i
+                    r_id = room_ids[i]
+                    # place
+                    for s in mask_slots(mask):
+                        placements.append((c_id, day_slots[day][s], s_id, t_id, r_id))
+                    search.book(c_id, t_id, r_id, day, mask)
+                    class_subject_day_count[(c_id, day, s_id)] += length
+                    # consume one from the list
+                    pending[c_id].remove((s_id, length))
+                    placed = True
+                    blocks_placed += 1
+                    break
                 if placed:
                     break
+                backtracks += 1  # this subject didn't fit here, fall back to the next one
+
+    return placements, {"blocks_placed": blocks_placed, "blocks_needed": len(blocks),
+                        "attempts": attempts, "teacher_conflicts": teacher_conflicts,
+                        "room_conflicts": room_conflicts, "backtracks": backtracks}
+
+def solve(problem: Problem, config: Optional[SolveConfig] = None) -> Tuple[List[Placement], Dict[str, int]]:
+    config = config or SolveConfig()
+    if config.decompose:
+        from decompose import solve_decomposed
+        return solve_decomposed(problem, config)
+    if config.engine == "cpsat":
+        from cpsat import solve_cpsat
+        return solve_cpsat(problem, time_limit=config.time_limit, seed=config.seed, workers=config.workers or 1)
+    return solve_greedy(problem, rng=config.rng())
+
+def generate_schedule(db: Session, config: Optional[SolveConfig] = None, name: Optional[str] = None,
+                      activate: bool = True, revision: Optional[int] = None) -> Dict[str, object]:
+    # revision: the live revision this run is based on (default: the current
+    # one). The result replaces the whole timetable, so if the schedule
+    # changed while solving StaleRevision is raised and nothing is stored
+    config = config or SolveConfig()
+    engine = config.engine
+    base_id, current = versions.head(db)
+    if revision is None:
+        revision = current
+    elif revision != current:
+        raise versions.StaleRevision(revision, current)
+    with metrics.span("scheduler_phase", phase="load"):
+        problem = load_problem(db)
+    with metrics.span("scheduler_phase", phase="solve", engine=engine):
+        placements, extra = solve(problem, config)
+    for counter in COUNTERS:
+        if counter in extra:
+            metrics.inc(f"scheduler_{counter}_total", extra[counter], engine=engine)
 
-    db.commit()
-    # Return simple stats
-    total_needed = len(expanded)
-    return {"placed": success_count, "needed": total_needed}
+    # Store as a new schedule version (staged), then swap it in; only the
+    # rows that differ from the live schedule are rewritten
+    with metrics.span("scheduler_phase", phase="store"):
+        v, revision = versions.save_state(db, versions.placements_state(placements),
+                                          name or f"generate ({engine})", activate=activate,
+                                          config=config.as_dict(), revision=revision, base_id=base_id)
+    # Return simple stats; revision is the live one after the swap
+    return {"placed": len(placements), "needed": problem.total_periods(), **extra,
+            "version_id": v.id, "changed": v.changed, "config": config.as_dict(), "revision": revision}
@@ -1,11 +1,12 @@
 from __future__ import annotations
 from sqlalchemy.orm import Session
-from db import engine, Base  # Changed from .db import
-from models import Teacher, Subject, TeacherSubject, ClassGroup, Room, TimeSlot, SubjectRequirement  # Changed from .models import
+import migrate
+from db import get_engine, SessionLocal
+from models import Teacher, Subject, TeacherSubject, ClassGroup, Room, TimeSlot, SubjectRequirement
 
 def run():
-    Base.metadata.create_all(bind=engine)
-    from db import SessionLocal  # Changed from .db import
+    for step in migrate.upgrade(get_engine()):
+        print(f"migrated: {step}")
     db: Session = SessionLocal()
 
     # Only seed if empty
@@ -55,15 +56,16 @@ def run():
 
     # Subject requirements per class (periods per week)
     # Keep small/easy for prototype
-    def req(c, s, n): db.add(SubjectRequirement(class_id=c.id, subject_id=s.id, periods_per_week=n))
+    # block = consecutive periods taught as one session (e.g. 2 for a science lab)
+    def req(c, s, n, block=1): db.add(SubjectRequirement(class_id=c.id, subject_id=s.id, periods_per_week=n, block_length=block))
 
     req(c1, s_math, 5)
-    req(c1, s_sci, 4)
+    req(c1, s_sci, 4, block=2)
     req(c1, s_eng, 4)
     req(c1, s_hist, 3)
 
     req(c2, s_math, 5)
-    req(c2, s_sci, 4)
+    req(c2, s_sci, 4, block=2)
     req(c2, s_eng, 4)
     req(c2, s_hist, 3)
 
@@ -0,0 +1,160 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from starlette.responses import FileResponse, PlainTextResponse, Response
+
+# Frontend build + serving.
+#
+# build() copies the frontend into <frontend>/dist with content-hashed names
+# for everything except index.html (app.js -> app.3f2a9c1e0b7d.js), rewrites
+# the references in index.html, and writes .gz (and .br when the brotli
+# package is installed) next to every file, plus a manifest.json.
+#
+# PrecompressedStatic serves that directory: it picks the best precompressed
+# variant for the request's Accept-Encoding, answers If-None-Match with 304,
+# and marks hashed files immutable. Everything it needs per request is held in
+# memory from the manifest, so a static hit costs a dict lookup and a sendfile.
+
+MANIFEST = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+ENCODINGS = ("br", "gzip")  # preference order
+SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+try:
+    import brotli  # optional
+except ImportError:
+    brotli = None
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def _compress(path: Path, data: bytes) -> List[str]:
+    encodings = []
+    gz = gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0: reproducible output
+    if len(gz) < len(data):
+        path.with_name(path.name + ".gz").write_bytes(gz)
+        encodings.append("gzip")
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            path.with_name(path.name + ".br").write_bytes(br)
+            encodings.append("br")
+    return encodings
+
+def build(src: Path, out: Optional[Path] = None) -> Dict[str, dict]:
+    out = out or src / "dist"
+    out.mkdir(parents=True, exist_ok=True)
+    for old in out.iterdir():
+        if old.is_file():
+            old.unlink()
+
+    manifest: Dict[str, dict] = {}
+    renamed: Dict[str, str] = {}
+    files = sorted(p for p in src.iterdir() if p.is_file())
+    for p in files:
+        if p.name == "index.html":
+            continue
+        data = p.read_bytes()
+        digest = _digest(data)
+        name = f"{p.stem}.{digest}{p.suffix}"
+        (out / name).write_bytes(data)
+        renamed[p.name] = name
+        manifest["/" + name] = {"file": name, "etag": digest, "immutable": True,
+                                "encodings": _compress(out / name, data)}
+
+    index = src / "index.html"
+    if index.exists():
+        html = index.read_text(encoding="utf-8")
+        for old, new in renamed.items():
+            html = re.sub(rf'((?:src|href)=")(\./)?{re.escape(old)}"', rf'\g<1>\g<2>{new}"', html)
+        data = html.encode("utf-8")
+        (out / "index.html").write_bytes(data)
+        entry = {"file": "index.html", "etag": _digest(data), "immutable": False,
+                 "encodings": _compress(out / "index.html", data)}
+        manifest["/"] = manifest["/index.html"] = entry
+
+    (out / MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+def _accepted(header: str) -> set:
+    # content codings the client accepts (q > 0)
+    out = set()
+    for part in header.split(","):
+        token, *params = part.strip().split(";")
+        q = 1.0
+        for param in params:
+            k, _, v = param.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            out.add(token.strip().lower())
+    if "*" in out:
+        out.update(ENCODINGS)
+    return out
+
+class PrecompressedStatic:
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        manifest = json.loads((self.directory / MANIFEST).read_text())
+        self.entries = {}
+        for url, entry in manifest.items():
+            path = self.directory / entry["file"]
+            media_type = mimetypes.guess_type(entry["file"])[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+                media_type += "; charset=utf-8"
+            # each encoding is a different representation, so it gets its own etag
+            variants = {None: (str(path), os.stat(path), f'"{entry["etag"]}"')}
+            for enc in entry["encodings"]:
+                p = str(path) + SUFFIX[enc]
+                variants[enc] = (p, os.stat(p), f'"{entry["etag"]}-{enc}"')
+            self.entries[url] = {
+                "etags": {v[2] for v in variants.values()},
+                "cache": IMMUTABLE if entry["immutable"] else REVALIDATE,
+                "media_type": media_type,
+                "variants": variants,
+            }
+
+    @classmethod
+    def available(cls, directory: Path) -> bool:
+        return (Path(directory) / MANIFEST).exists()
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+            await response(scope, receive, send)
+            return
+        entry = self.entries.get(scope["path"])
+        if entry is None:
+            response = PlainTextResponse("Not Found", status_code=404)
+            await response(scope, receive, send)
+            return
+
+        headers = {}
+        for k, v in scope["headers"]:
+            headers[k.decode("latin-1")] = v.decode("latin-1")
+        accepted = _accepted(headers.get("accept-encoding", ""))
+        enc = next((e for e in ENCODINGS if e in entry["variants"] and e in accepted), None)
+        path, stat, etag = entry["variants"][enc]
+        base = {"etag": etag, "cache-control": entry["cache"], "vary": "Accept-Encoding"}
+
+        if_none_match = {t.strip() for t in headers.get("if-none-match", "").split(",")}
+        if "*" in if_none_match or if_none_match & entry["etags"]:
+            await Response(status_code=304, headers=base)(scope, receive, send)
+            return
+
+        if enc is not None:
+            base["content-encoding"] = enc
+        # our etag (the content hash) takes precedence over the stat-based one FileResponse would add
+        response = FileResponse(path, stat_result=stat, media_type=entry["media_type"], headers=base)
+        await response(scope, receive, send)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import threading
+
+from sqlalchemy.orm import Session
+
+import versions
+from constraints import Constraint, Search
+from models import Term, TermPattern, WeekException, TimeSlot
+from problem import load_placement
+
+# Term calendars without multiplying timeslots.
+#
+# A term is a start Monday, a number of weeks and a rotation of weekly
+# patterns. Each pattern is an ordinary schedule version, solved once as a
+# single week; week w follows pattern w % len(rotation), so A/B weeks are two
+# versions. What differs in a particular week (a holiday, a cover teacher, a
+# moved lesson) is stored as per-cell exceptions and patched onto the pattern
+# when that week is read. A term costs one weekly solve per pattern plus
+# O(exceptions), however many weeks it has.
+
+CACHE_SIZE = 16
+
+class Refused(Exception):
+    # a week exception a registered constraint does not allow
+    def __init__(self, constraint: Constraint):
+        super().__init__(constraint.message)
+        self.constraint = constraint
+
+# Materialised pattern states, by version id. Versions never change once
+# written, so entries never go stale.
+_cache: "OrderedDict[int, Dict[versions.Key, versions.Row]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def pattern_state(db: Session, version_id: int) -> Dict[versions.Key, versions.Row]:
+    with _cache_lock:
+        if version_id in _cache:
+            _cache.move_to_end(version_id)
+            return _cache[version_id]
+    state = versions.materialize(db, version_id)
+    with _cache_lock:
+        _cache[version_id] = state
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return state
+
+def create_term(db: Session, name: str, start: date, weeks: int,
+                pattern_ids: Optional[List[int]] = None) -> Term:
+    # the rotation defaults to the live schedule as the only weekly pattern
+    if weeks < 1:
+        raise ValueError("weeks must be at least 1")
+    pattern_ids = pattern_ids or [versions.active_version(db).id]
+    for version_id in pattern_ids:
+        versions.materialize(db, version_id)  # KeyError for an unknown version
+    term = Term(name=name, start=start - timedelta(days=start.weekday()), weeks=weeks,
+                patterns=[TermPattern(position=i, version_id=v) for i, v in enumerate(pattern_ids)])
+    db.add(term)
+    db.commit()
+    return term
+
+def _check_week(term: Term, week: int) -> None:
+    if not 0 <= week < term.weeks:
+        raise ValueError(f"week must be between 0 and {term.weeks - 1}")
+
+def week_pattern(term: Term, week: int) -> int:
+    return term.patterns[week % len(term.patterns)].version_id
+
+def week_exceptions(db: Session, term_id: int, week: int) -> List[WeekException]:
+    return (db.query(WeekException)
+            .filter(WeekException.term_id == term_id, WeekException.week == week)
+            .order_by(WeekException.id).all())
+
+def week_state(db: Session, term: Term, week: int) -> Dict[versions.Key, versions.Row]:
+    _check_week(term, week)
+    state = dict(pattern_state(db, week_pattern(term, week)))
+    versions.apply_to_state(state, [
+        ((e.class_id, e.timeslot_id), None,
+         (e.subject_id, e.teacher_id, e.room_id) if e.subject_id is not None else None)
+        for e in week_exceptions(db, term.id, week)])
+    return state
+
+def week_dates(term: Term, week: int) -> Tuple[date, date]:
+    monday = term.start + timedelta(weeks=week)
+    return monday, monday + timedelta(days=6)
+
+def set_exception(db: Session, term: Term, week: int, class_id: int, timeslot: TimeSlot,
+                  row: Optional[versions.Row], note: str = "") -> WeekException:
+    # Replace one cell of one week (row=None cancels the lesson). A
+    # replacement is checked against that week's timetable by the registered
+    # constraints, like an override of the live schedule. KeyError names an
+    # unknown class, subject, teacher or room.
+    _check_week(term, week)
+    if row is not None:
+        problem = load_placement(db, class_id, *row, (timeslot.id, timeslot.day, timeslot.slot))
+        state = week_state(db, term, week)
+        others = [(c, ts, *r) for (c, ts), r in state.items() if ts == timeslot.id and c != class_id]
+        refused = Search(problem, occupied=others).violation(class_id, row[0], row[1], row[2],
+                                                             timeslot.day, 1 << timeslot.slot)
+        if refused is not None:
+            raise Refused(refused)
+    e = (db.query(WeekException)
+         .filter(WeekException.term_id == term.id, WeekException.week == week,
+                 WeekException.class_id == class_id, WeekException.timeslot_id == timeslot.id)
+         .first())
+    if e is None:
+        e = WeekException(term_id=term.id, week=week, class_id=class_id, timeslot_id=timeslot.id)
+        db.add(e)
+    e.subject_id, e.teacher_id, e.room_id = row if row is not None else (None, None, None)
+    e.note = note
+    db.commit()
+    return e
+
+def cancel_day(db: Session, term: Term, week: int, day: int, note: str = "") -> int:
+    # a holiday: every lesson of that day is cancelled for this week only
+    _check_week(term, week)
+    slots = {ts_id for ts_id, in db.query(TimeSlot.id).filter(TimeSlot.day == day)}
+    cells = [k for k in week_state(db, term, week) if k[1] in slots]
+    existing = {(e.class_id, e.timeslot_id): e for e in week_exceptions(db, term.id, week)}
+    for c_id, ts_id in cells:
+        e = existing.get((c_id, ts_id))
+        if e is None:
+            e = WeekException(term_id=term.id, week=week, class_id=c_id, timeslot_id=ts_id)
+            db.add(e)
+        e.subject_id = e.teacher_id = e.room_id = None
+        e.note = note
+    db.commit()
+    return len(cells)
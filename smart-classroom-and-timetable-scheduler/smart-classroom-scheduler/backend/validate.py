@@ -0,0 +1,61 @@
+from __future__ import annotations
+from itertools import chain
+from typing import Dict, List, Optional
+import time
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import versions
+from constraints import Constraint, Tables, registry
+from enrollment import load_edges
+from models import Assignment, ClassGroup, Room, SubjectRequirement, TeacherSubject
+
+# Whole-timetable validation on NumPy arrays.
+#
+# Assignments are loaded as one (n, 5) int64 array
+#   class_id, timeslot_id, subject_id, teacher_id, room_id
+# and every registered constraint (see constraints.py) checks it in one
+# vectorised pass: double-bookings by bincount over (entity, timeslot) codes,
+# student clashes by an occupancy bitmap over the conflict graph's edges,
+# qualifications through a teacher x subject bitmap, capacities by gathers
+# from id-indexed arrays, requirement shortfalls by counts on sorted keys.
+
+LIMIT = 100  # violations listed per kind; counts are always complete
+
+def validate_arrays(tables: Tables, limit: int = LIMIT,
+                    constraints: Optional[List[Constraint]] = None) -> Dict[str, object]:
+    counts: Dict[str, int] = {}
+    out: Dict[str, object] = {"assignments": len(tables.assign), "counts": counts}
+    for con in registry() if constraints is None else constraints:
+        counts[con.name], out[con.name] = con.violations(tables, limit)
+    out["ok"] = not any(counts.values())
+    return out
+
+def query_array(db: Session, stmt, cols: int) -> np.ndarray:
+    # straight from the result rows into one flat buffer; np.array() on a
+    # list of Row objects converts each one through the sequence protocol
+    # and is an order of magnitude slower
+    return np.fromiter(chain.from_iterable(db.execute(stmt)), dtype=np.int64).reshape(-1, cols)
+
+def validate(db: Session, version_id: Optional[int] = None, limit: int = LIMIT) -> Dict[str, object]:
+    # the live assignments table, or a stored version (e.g. an unactivated candidate)
+    t0 = time.perf_counter()
+    if version_id is None:
+        a = Assignment.__table__.c
+        assign = query_array(db, select(a.class_id, a.timeslot_id, a.subject_id, a.teacher_id, a.room_id), 5)
+    else:
+        state = versions.materialize(db, version_id)
+        assign = np.array([(c, ts, *row) for (c, ts), row in state.items()], dtype=np.int64).reshape(-1, 5)
+    qual = query_array(db, select(TeacherSubject.teacher_id, TeacherSubject.subject_id), 2)
+    class_size = query_array(db, select(ClassGroup.id, ClassGroup.size), 2)
+    room_capacity = query_array(db, select(Room.id, Room.capacity), 2)
+    requirements = query_array(db, select(SubjectRequirement.class_id, SubjectRequirement.subject_id,
+                                     SubjectRequirement.periods_per_week), 3)
+    conflicts = load_edges(db)
+    t1 = time.perf_counter()
+    out = validate_arrays(Tables(assign, qual, class_size, room_capacity, requirements, conflicts), limit)
+    out["load_ms"] = round((t1 - t0) * 1000, 2)
+    out["check_ms"] = round((time.perf_counter() - t1) * 1000, 2)
+    return out
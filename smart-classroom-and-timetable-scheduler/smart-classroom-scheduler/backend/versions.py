@@ -0,0 +1,327 @@
+from __future__ import annotations
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import sys
+import zlib
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.orm import Session, aliased
+
+import metrics
+from models import Assignment, ScheduleVersion, ScheduleState
+from problem import Placement
+
+# Versions are stored copy-on-write: each one keeps only its changes against
+# its parent, as packed int32 rows (class_id, timeslot_id, old s/t/r, new s/t/r)
+# with 0 for "no assignment". Storing the old value too makes every delta
+# reversible, so the diff between any two versions only touches the deltas on
+# the path between them. Every SNAPSHOT_EVERY levels a full packed snapshot is
+# kept as well so materialising a version never replays a long chain.
+#
+# Every change to the live schedule bumps a revision number in the state row.
+# Writers name the revision their reads were based on and the swap is a
+# compare-and-swap on it, issued as the first statement of the write
+# transaction: it takes SQLite's write lock and checks in one step, so a
+# stale writer fails at once (StaleRevision) instead of overwriting a
+# concurrent change, and no lock is held while a caller solves or checks.
+# A staged full state (a generate) replaces the whole timetable, so it is
+# never merged with changes made meanwhile: if it loses the race it is
+# deleted and StaleRevision raised, so lost races leave no versions behind.
+SNAPSHOT_EVERY = 32
+
+log = logging.getLogger(__name__)
+
+Key = Tuple[int, int]                  # (class_id, timeslot_id)
+Row = Tuple[int, int, int]             # (subject_id, teacher_id, room_id)
+Change = Tuple[Key, Optional[Row], Optional[Row]]  # (key, before, after)
+
+_NONE = (0, 0, 0)
+
+class StaleRevision(Exception):
+    # the live schedule moved on since the revision a write was based on
+    def __init__(self, expected: int, current: int):
+        super().__init__(f"The schedule changed meanwhile (revision {current}, expected {expected}).")
+        self.expected = expected
+        self.current = current
+
+def _pack(values: Iterable[int]) -> bytes:
+    a = array("i", values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return zlib.compress(a.tobytes())
+
+def _unpack(blob: bytes) -> array:
+    a = array("i")
+    a.frombytes(zlib.decompress(blob))
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+def pack_state(state: Dict[Key, Row]) -> bytes:
+    return _pack(v for (c, ts), row in sorted(state.items()) for v in (c, ts, *row))
+
+def unpack_state(blob: bytes) -> Dict[Key, Row]:
+    a = _unpack(blob)
+    return {(a[i], a[i + 1]): (a[i + 2], a[i + 3], a[i + 4]) for i in range(0, len(a), 5)}
+
+def pack_changes(changes: Iterable[Change]) -> bytes:
+    return _pack(v for (c, ts), old, new in changes for v in (c, ts, *(old or _NONE), *(new or _NONE)))
+
+def unpack_changes(blob: bytes) -> List[Change]:
+    a = _unpack(blob)
+    out = []
+    for i in range(0, len(a), 8):
+        old = (a[i + 2], a[i + 3], a[i + 4])
+        new = (a[i + 5], a[i + 6], a[i + 7])
+        out.append(((a[i], a[i + 1]), None if old == _NONE else old, None if new == _NONE else new))
+    return out
+
+def placements_state(placements: Iterable[Placement]) -> Dict[Key, Row]:
+    return {(c_id, ts_id): (s_id, t_id, r_id) for c_id, ts_id, s_id, t_id, r_id in placements}
+
+def state_changes(before: Dict[Key, Row], after: Dict[Key, Row]) -> List[Change]:
+    changes = [(k, old, after.get(k)) for k, old in before.items() if after.get(k) != old]
+    changes.extend((k, None, new) for k, new in after.items() if k not in before)
+    return changes
+
+# ---------- Version graph ----------
+def _state_row(db: Session) -> ScheduleState:
+    st = db.get(ScheduleState, 1)
+    if st is None:
+        st = ScheduleState(id=1, active_version_id=None, revision=0)
+        db.add(st)
+        db.flush()
+    return st
+
+def active_version(db: Session) -> ScheduleVersion:
+    st = _state_row(db)
+    if st.active_version_id is None:
+        # First use on a database that predates versioning: adopt whatever is
+        # in the assignments table as the root version (the only full scan)
+        rows = db.query(Assignment.class_id, Assignment.timeslot_id, Assignment.subject_id,
+                        Assignment.teacher_id, Assignment.room_id).all()
+        v = _new_version(db, None, state_changes({}, placements_state(rows)), "initial")
+        st.active_version_id = v.id
+        db.flush()
+        return v
+    return db.get(ScheduleVersion, st.active_version_id)
+
+def revision(db: Session) -> int:
+    return _state_row(db).revision
+
+def head(db: Session) -> Tuple[int, int]:
+    # (active version id, revision), read together from the state row
+    active_version(db)
+    db.flush()
+    return tuple(db.execute(select(ScheduleState.active_version_id, ScheduleState.revision)
+                            .where(ScheduleState.id == 1)).one())
+
+def _claim(db: Session, expected: Optional[int]) -> int:
+    # Start the write transaction with the compare-and-swap; expected=None
+    # writes unconditionally (still bumping the revision). -> the revision
+    # this transaction writes
+    _state_row(db)
+    db.commit()
+    stmt = update(ScheduleState).where(ScheduleState.id == 1)
+    if expected is not None:
+        stmt = stmt.where(ScheduleState.revision == expected)
+    if db.execute(stmt.values(revision=ScheduleState.revision + 1)).rowcount == 0:
+        db.rollback()
+        raise StaleRevision(expected, db.execute(select(ScheduleState.revision)).scalar_one())
+    # read inside the write transaction, so no other writer can have moved it
+    return db.execute(select(ScheduleState.revision).where(ScheduleState.id == 1)).scalar_one()
+
+def _new_version(db: Session, parent: Optional[ScheduleVersion], changes: List[Change],
+                 name: str, config: Optional[dict] = None) -> ScheduleVersion:
+    depth = parent.depth + 1 if parent is not None else 0
+    size = (parent.size if parent is not None else 0)
+    size += sum((new is not None) - (old is not None) for _, old, new in changes)
+    v = ScheduleVersion(
+        name=name,
+        parent_id=parent.id if parent is not None else None,
+        depth=depth,
+        size=size,
+        changed=len(changes),
+        delta=pack_changes(changes),
+        config=json.dumps(config, sort_keys=True) if config is not None else None,
+    )
+    if parent is None:
+        v.snapshot = pack_state({k: new for k, _, new in changes if new is not None})
+    elif depth % SNAPSHOT_EVERY == 0:
+        state = materialize(db, parent.id)
+        apply_to_state(state, changes)
+        v.snapshot = pack_state(state)
+    db.add(v)
+    db.flush()
+    return v
+
+def apply_to_state(state: Dict[Key, Row], changes: Iterable[Change]) -> None:
+    for k, _, new in changes:
+        if new is None:
+            state.pop(k, None)
+        else:
+            state[k] = new
+
+def _node(db: Session, version_id: Optional[int]):
+    # (id, parent_id, depth), or None above a root
+    if version_id is None:
+        return None
+    row = db.execute(select(ScheduleVersion.id, ScheduleVersion.parent_id, ScheduleVersion.depth)
+                     .where(ScheduleVersion.id == version_id)).first()
+    if row is None:
+        raise KeyError(version_id)
+    return tuple(row)
+
+def _paths(db: Session, a_id: int, b_id: int) -> Tuple[List[int], List[int]]:
+    # The versions below the nearest common ancestor down to a and to b, in
+    # apply order. The deeper side steps up until the two meet, so the cost
+    # is the distance between them, not their depth in the tree.
+    a, b = _node(db, a_id), _node(db, b_id)
+    up_a, up_b = [], []
+    while a != b:
+        if b is None or (a is not None and a[2] >= b[2]):
+            up_a.append(a[0])
+            a = _node(db, a[1])
+        else:
+            up_b.append(b[0])
+            b = _node(db, b[1])
+    return up_a[::-1], up_b[::-1]
+
+def materialize(db: Session, version_id: int) -> Dict[Key, Row]:
+    chain = []
+    vid = version_id
+    while True:
+        v = db.get(ScheduleVersion, vid)
+        if v is None:
+            raise KeyError(version_id)
+        if v.snapshot is not None:
+            state = unpack_state(v.snapshot)
+            break
+        chain.append(v)
+        vid = v.parent_id
+    for v in reversed(chain):
+        apply_to_state(state, unpack_changes(v.delta))
+    return state
+
+def _compose(db: Session, path: List[int]) -> Dict[Key, List[Optional[Row]]]:
+    # key -> [value before the first version on path, value after the last]
+    out: Dict[Key, List[Optional[Row]]] = {}
+    for vid in path:
+        for k, old, new in unpack_changes(db.get(ScheduleVersion, vid).delta):
+            if k in out:
+                out[k][1] = new
+            else:
+                out[k] = [old, new]
+    return out
+
+def diff(db: Session, a_id: int, b_id: int) -> List[Change]:
+    # Changes turning version a into version b, read only from the deltas
+    # between them and their nearest common ancestor
+    path_a, path_b = _paths(db, a_id, b_id)
+    ca = _compose(db, path_a)
+    cb = _compose(db, path_b)
+    out = []
+    for k in ca.keys() | cb.keys():
+        before = ca[k][1] if k in ca else cb[k][0]
+        after = cb[k][1] if k in cb else ca[k][0]
+        if before != after:
+            out.append((k, before, after))
+    out.sort(key=lambda ch: ch[0])
+    return out
+
+# ---------- Live table ----------
+_listeners: List[Callable[[Session, int, List[Change]], None]] = []
+
+def on_change(callback: Callable[[Session, int, List[Change]], None]) -> None:
+    # callback(db, active_version_id, changes) after every committed change to the live schedule
+    _listeners.append(callback)
+
+def _notify(db: Session, version_id: int, changes: List[Change]) -> None:
+    for callback in _listeners:
+        try:
+            callback(db, version_id, changes)
+        except Exception:
+            log.exception("schedule change listener failed")
+
+def apply_changes(db: Session, changes: List[Change]) -> None:
+    # O(changed) writes against the assignments table
+    table = Assignment.__table__
+    keys = [{"c": c, "ts": ts} for (c, ts), old, _ in changes if old is not None]
+    if keys:
+        db.execute(table.delete().where(table.c.class_id == bindparam("c"),
+                                        table.c.timeslot_id == bindparam("ts")), keys)
+    rows = [{"class_id": c, "timeslot_id": ts, "subject_id": new[0], "teacher_id": new[1], "room_id": new[2]}
+            for (c, ts), _, new in changes if new is not None]
+    if rows:
+        db.execute(table.insert(), rows)
+
+def commit_version(db: Session, changes: List[Change], name: str, activate: bool = True,
+                   config: Optional[dict] = None, revision: Optional[int] = None) -> ScheduleVersion:
+    # New child of the active version; when activated, the live table gets
+    # exactly these changes, provided it is still at `revision`
+    if activate:
+        _claim(db, revision)
+    parent = active_version(db)
+    v = _new_version(db, parent, changes, name, config)
+    if activate:
+        apply_changes(db, changes)
+        _state_row(db).active_version_id = v.id
+    with metrics.span("db_commit"):
+        db.commit()
+    if activate:
+        _notify(db, v.id, changes)
+    return v
+
+def _discard(db: Session, version_id: int) -> None:
+    # delete a staged version, unless it was activated or built on meanwhile
+    child = aliased(ScheduleVersion)
+    db.execute(delete(ScheduleVersion).where(
+        ScheduleVersion.id == version_id,
+        ~select(child.id).where(child.parent_id == version_id).exists(),
+        ~select(ScheduleState.id).where(ScheduleState.active_version_id == version_id).exists()))
+    db.commit()
+
+def save_state(db: Session, state: Dict[Key, Row], name: str, activate: bool = True,
+               config: Optional[dict] = None, revision: Optional[int] = None,
+               base_id: Optional[int] = None) -> Tuple[ScheduleVersion, int]:
+    # Staged first: the version is written and committed as a child of
+    # base_id (the version `state` was computed from, default the active one)
+    # without touching the live schedule, then swapped in by a short
+    # compare-and-swap transaction. If the live schedule moved on from
+    # `revision`, the staged version is deleted and StaleRevision raised.
+    # -> (the version, the live revision afterwards)
+    base = db.get(ScheduleVersion, base_id) if base_id is not None else active_version(db)
+    v = _new_version(db, base, state_changes(materialize(db, base.id), state), name, config)
+    db.commit()
+    if not activate:
+        return v, head(db)[1]
+    try:
+        _, written = _swap(db, v.id, revision)
+    except StaleRevision:
+        _discard(db, v.id)
+        raise
+    return v, written
+
+def activate(db: Session, version_id: int, revision: Optional[int] = None) -> Tuple[List[Change], int]:
+    if db.get(ScheduleVersion, version_id) is None:
+        raise KeyError(version_id)
+    return _swap(db, version_id, revision)
+
+def _swap(db: Session, version_id: int, revision: Optional[int]) -> Tuple[List[Change], int]:
+    # -> (changes applied to the live table, the revision written)
+    written = _claim(db, revision)
+    target = db.get(ScheduleVersion, version_id)
+    current = active_version(db)
+    if target.parent_id == current.id:
+        # a staged child of the live version: its delta is the change
+        changes = unpack_changes(target.delta)
+    else:
+        changes = diff(db, current.id, version_id)
+    apply_changes(db, changes)
+    _state_row(db).active_version_id = version_id
+    with metrics.span("db_commit"):
+        db.commit()
+    _notify(db, version_id, changes)
+    return changes, written
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Set, Tuple
+import multiprocessing
+import os
+import threading
+
+from sqlalchemy.orm import Session
+
+import versions
+from models import Subject, Teacher
+from problem import Placement, Problem, load_problem
+from scheduler import SolveConfig, solve
+
+# What-if scenarios, solved without touching the database.
+#
+# The live problem is loaded once per request; each scenario applies its
+# change set to its own in-memory copy and is solved in a shared process
+# pool, so scenarios (from one request or several) run side by side and
+# hold no database connection or lock while solving. Each result is
+# compared with the live schedule: placed/needed, the unplaced periods and
+# the cells that would change.
+#
+# The pool's processes come from a fork server rather than being forked from
+# the (threaded) web worker, which could copy a lock held by another thread.
+#
+# Hypothetical rooms and teachers get negative ids (-1, -2, ...) so they can
+# never be mistaken for real ones in the diff.
+
+WORKERS = int(os.environ.get("SMART_CLASSROOM_WHATIF_WORKERS", 0)) or os.cpu_count() or 1
+MAX_SCENARIOS = 8
+LIMIT = 100  # changed cells listed per scenario; counts are always complete
+
+@dataclass
+class Scenario:
+    name: str = ""
+    add_rooms: List[int] = field(default_factory=list)             # capacities
+    remove_rooms: List[int] = field(default_factory=list)          # room ids
+    add_teachers: List[List[int]] = field(default_factory=list)    # subject ids each new teacher can teach
+    remove_teachers: List[int] = field(default_factory=list)       # teacher ids
+    class_sizes: Dict[int, int] = field(default_factory=dict)      # class id -> size
+    requirements: List[Tuple[int, int, int, int]] = field(default_factory=list)  # (class, subject, periods, block); 0 periods drops it
+    config: SolveConfig = field(default_factory=SolveConfig)
+
+def _unknown(kind: str, ids) -> None:
+    if ids:
+        raise ValueError(f"unknown {kind}: {', '.join(map(str, sorted(ids)))}")
+
+def apply(problem: Problem, s: Scenario, subject_ids: Optional[Set[int]] = None,
+          teacher_ids: Optional[Set[int]] = None) -> Problem:
+    # a new Problem; the live one is shared by every scenario and never mutated.
+    # subject_ids / teacher_ids: every known subject / teacher (default: those
+    # taught or required / those qualified for some subject)
+    room_ids = {r for r, _ in problem.rooms}
+    if teacher_ids is None:
+        teacher_ids = {t for ts in problem.qual.values() for t in ts}
+    if subject_ids is None:
+        subject_ids = set(problem.qual) | {r[1] for r in problem.requirements}
+    _unknown("rooms", set(s.remove_rooms) - room_ids)
+    _unknown("teachers", set(s.remove_teachers) - teacher_ids)
+    _unknown("classes", (set(s.class_sizes) | {r[0] for r in s.requirements}) - set(problem.class_sizes))
+    _unknown("subjects", ({sub for subs in s.add_teachers for sub in subs} | {r[1] for r in s.requirements})
+             - subject_ids)
+
+    removed_rooms = set(s.remove_rooms)
+    rooms = [r for r in problem.rooms if r[0] not in removed_rooms]
+    rooms += [(-(i + 1), cap) for i, cap in enumerate(s.add_rooms)]
+    rooms.sort(key=lambda r: r[1])
+
+    removed_teachers = set(s.remove_teachers)
+    qual = {sub: [t for t in ts if t not in removed_teachers] for sub, ts in problem.qual.items()}
+    for i, subjects in enumerate(s.add_teachers):
+        for sub in subjects:
+            qual.setdefault(sub, []).append(-(i + 1))
+
+    reqs = {(c, sub): (n, length) for c, sub, n, length in problem.requirements}
+    for c, sub, n, length in s.requirements:
+        if n > 0:
+            reqs[(c, sub)] = (n, length or 1)
+        else:
+            reqs.pop((c, sub), None)
+
+    return Problem(
+        class_sizes={**problem.class_sizes, **s.class_sizes},
+        rooms=rooms,
+        timeslots=problem.timeslots,
+        qual=qual,
+        requirements=[(c, sub, n, length) for (c, sub), (n, length) in reqs.items()],
+        conflicts=problem.conflicts,
+    )
+
+def unplaced(problem: Problem, placements: List[Placement]) -> List[Tuple[int, int, int]]:
+    # (class_id, subject_id, periods missing)
+    placed = Counter((c, sub) for c, _, sub, _, _ in placements)
+    return [(c, sub, n - placed[(c, sub)]) for c, sub, n, _ in problem.requirements if n > placed[(c, sub)]]
+
+# ---------- Worker pool ----------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
+
+def _solve(problem: Problem, config: SolveConfig):
+    return solve(problem, config)
+
+def run(db: Session, scenarios: List[Scenario], limit: int = LIMIT) -> Dict[str, object]:
+    if not 1 <= len(scenarios) <= MAX_SCENARIOS:
+        raise ValueError(f"between 1 and {MAX_SCENARIOS} scenarios per request")
+    problem = load_problem(db)
+    subject_ids = {sub for sub, in db.query(Subject.id)}
+    teacher_ids = {t for t, in db.query(Teacher.id)}
+    live = versions.materialize(db, versions.active_version(db).id)
+    db.commit()  # nothing below touches the database
+    copies = [apply(problem, s, subject_ids, teacher_ids) for s in scenarios]  # every change set is checked before any solve
+
+    # a pool worker can't start a pool of its own: decomposed runs go serial
+    futures = [pool().submit(_solve, p, replace(s.config, workers=1) if s.config.decompose else s.config)
+               for p, s in zip(copies, scenarios)]
+    out = []
+    for s, p, fut in zip(scenarios, copies, futures):
+        placements, stats = fut.result()
+        changes = versions.state_changes(live, versions.placements_state(placements))
+        changes.sort(key=lambda ch: ch[0])
+        needed = p.total_periods()
+        out.append({
+            "name": s.name,
+            "placed": len(placements),
+            "needed": needed,
+            "score": round(100.0 * len(placements) / needed, 2) if needed else 100.0,
+            "unplaced": unplaced(p, placements),
+            "changed": len(changes),
+            "changes": changes[:limit],
+            "stats": stats,
+            "config": s.config.as_dict(),
+        })
+    needed = problem.total_periods()
+    return {
+        "live": {"placed": len(live), "needed": needed,
+                 "score": round(100.0 * len(live) / needed, 2) if needed else 100.0},
+        "scenarios": out,
+    }
@@ -0,0 +1,31 @@
+from __future__ import annotations
+import argparse
+import time
+
+import numpy as np
+
+import synth  # noqa: F401  (puts backend/ on sys.path)
+from enrollment import adjacency, cliques, conflict_edges
+
+def main():
+    ap = argparse.ArgumentParser(description="Course-conflict graph build time on random enrollments")
+    ap.add_argument("--students", default="1000,10000,50000", help="comma separated student counts")
+    ap.add_argument("--courses", type=int, default=6, help="courses per student")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'students':>9} {'classes':>8} {'edges':>8} {'graph ms':>9} {'cliques':>8} {'cover ms':>9}")
+    for n in (int(x) for x in args.students.split(",")):
+        classes = max(n // 25, 2)
+        students = np.repeat(np.arange(n), args.courses)
+        enrolled = rng.integers(0, classes, len(students))
+
+        t0 = time.perf_counter()
+        edges = conflict_edges(students, enrolled)
+        t1 = time.perf_counter()
+        cover = cliques(adjacency(edges))
+        t2 = time.perf_counter()
+        print(f"{n:>9} {classes:>8} {len(edges):>8} {(t1 - t0) * 1000:>9.1f} {len(cover):>8} {(t2 - t1) * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main()
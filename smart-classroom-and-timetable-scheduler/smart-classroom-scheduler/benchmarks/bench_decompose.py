@@ -0,0 +1,30 @@
+from __future__ import annotations
+import argparse
+import time
+
+from synth import synthetic_problem
+from scheduler import SolveConfig, solve
+
+def main():
+    ap = argparse.ArgumentParser(description="Monolithic vs decomposed solve time by district size")
+    ap.add_argument("--sizes", default="5,10,20,40", help="comma separated school counts")
+    ap.add_argument("--engine", default="greedy")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args()
+
+    print(f"{'schools':>8} {'classes':>8} {'mono s':>8} {'mono %':>7} {'decomp s':>9} {'decomp %':>9}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        problem = synthetic_problem(n)
+        needed = problem.total_periods()
+
+        t0 = time.perf_counter()
+        mono, _ = solve(synthetic_problem(n), SolveConfig(engine=args.engine))
+        t1 = time.perf_counter()
+        dec, _ = solve(problem, SolveConfig(engine=args.engine, workers=args.workers, decompose=True))
+        t2 = time.perf_counter()
+
+        print(f"{n:>8} {len(problem.class_sizes):>8} {t1 - t0:>8.2f} {100 * len(mono) / needed:>6.1f}%"
+              f" {t2 - t1:>9.2f} {100 * len(dec) / needed:>8.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+
+from synth import synthetic_problem
+import problem_io
+
+def main():
+    ap = argparse.ArgumentParser(description="Binary problem file size and load time")
+    ap.add_argument("--sizes", default="10,100,500", help="comma separated school counts")
+    args = ap.parse_args()
+
+    print(f"{'schools':>8} {'classes':>8} {'file KB':>8} {'map ms':>8} {'load ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in (int(x) for x in args.sizes.split(",")):
+            problem = synthetic_problem(n)
+            path = os.path.join(tmp, f"p{n}.sctp")
+            problem_io.save_problem(path, problem)
+
+            t0 = time.perf_counter()
+            _, arrays = problem_io.read_arrays(path)
+            t1 = time.perf_counter()
+            loaded = problem_io.problem_from_arrays(arrays)
+            t2 = time.perf_counter()
+            assert loaded.total_periods() == problem.total_periods()
+
+            print(f"{n:>8} {len(problem.class_sizes):>8} {os.path.getsize(path) / 1024:>8.0f}"
+                  f" {(t1 - t0) * 1000:>8.2f} {(t2 - t1) * 1000:>8.2f}")
+
+if __name__ == "__main__":
+    main()
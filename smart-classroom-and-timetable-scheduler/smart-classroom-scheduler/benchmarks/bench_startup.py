@@ -0,0 +1,64 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+# Cold start = fresh interpreter -> import app -> first API response, which is
+# what a newly spawned uvicorn worker pays before it can serve traffic.
+TARGET_MS = 750
+
+CHILD = r"""
+import asyncio, json, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter()
+
+async def first_request():
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/api/timeslots", "raw_path": b"/api/timeslots",
+             "query_string": b"", "root_path": "", "headers": [], "server": ("test", 80), "client": ("test", 1)}
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    await app.app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(first_request())
+t_first = time.perf_counter()
+print(json.dumps({"status": status, "import_ms": (t_import - t0) * 1000, "first_response_ms": (t_first - t0) * 1000}))
+"""
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure app cold-start time against a target")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--target-ms", type=float, default=TARGET_MS)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SMART_CLASSROOM_DB=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        subprocess.run([sys.executable, "manage.py", "init-db"], cwd=BACKEND, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        results = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND, env=env, check=True,
+                                 capture_output=True, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    imp = statistics.median(r["import_ms"] for r in results)
+    first = statistics.median(r["first_response_ms"] for r in results)
+    ok = first <= args.target_ms and all(r["status"] == 200 for r in results)
+    print(json.dumps({"runs": args.runs, "import_ms_median": round(imp, 1),
+                      "first_response_ms_median": round(first, 1), "target_ms": args.target_ms,
+                      "pass": ok}, indent=2))
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
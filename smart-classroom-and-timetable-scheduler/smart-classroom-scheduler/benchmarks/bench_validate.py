@@ -0,0 +1,72 @@
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import synth  # noqa: F401  (puts backend/ on sys.path)
+from constraints import Tables
+from db import Base
+from models import Assignment, ClassGroup, Room, SubjectRequirement, TeacherSubject
+from validate import validate, validate_arrays
+
+def load_ms(path: str, assign, qual, class_size, room_capacity, requirements) -> float:
+    # The same tables written to a SQLite file and read back by validate():
+    # the time to turn the query results into arrays. Duplicate keys are
+    # dropped first, since the tables have unique constraints on them.
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    def unique(a, key_cols):
+        return a[np.unique(a[:, :key_cols], axis=0, return_index=True)[1]].tolist()
+
+    with Session(engine) as db:
+        for model, cols, rows in [
+            (Assignment, ("class_id", "timeslot_id", "subject_id", "teacher_id", "room_id"), unique(assign, 2)),
+            (TeacherSubject, ("teacher_id", "subject_id"), unique(qual, 2)),
+            (ClassGroup, ("id", "size", "name"), [(i, n, f"Class {i}") for i, n in class_size.tolist()]),
+            (Room, ("id", "capacity", "name"), [(i, n, f"Room {i}") for i, n in room_capacity.tolist()]),
+            (SubjectRequirement, ("class_id", "subject_id", "periods_per_week"), unique(requirements, 2)),
+        ]:
+            db.execute(model.__table__.insert(), [dict(zip(cols, r)) for r in rows])
+        db.commit()
+        ms = validate(db)["load_ms"]
+    engine.dispose()
+    return ms
+
+def main():
+    ap = argparse.ArgumentParser(description="Validator time on random timetables")
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="comma separated assignment counts")
+    ap.add_argument("--db-max", type=int, default=100000, help="largest size also timed loading from SQLite")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp = tempfile.TemporaryDirectory()
+    print(f"{'assignments':>12} {'ms':>8} {'load ms':>8} {'teacher':>8} {'room':>8} {'unqual':>8} {'capacity':>9}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        classes, teachers, rooms, subjects, timeslots = n // 30, n // 25, n // 30, 200, 40
+        assign = np.column_stack([
+            rng.integers(1, classes + 1, n), rng.integers(1, timeslots + 1, n), rng.integers(1, subjects + 1, n),
+            rng.integers(1, teachers + 1, n), rng.integers(1, rooms + 1, n)])
+        qual = np.column_stack([rng.integers(1, teachers + 1, 4 * teachers), rng.integers(1, subjects + 1, 4 * teachers)])
+        class_size = np.column_stack([np.arange(1, classes + 1), rng.integers(20, 40, classes)])
+        room_capacity = np.column_stack([np.arange(1, rooms + 1), rng.integers(20, 60, rooms)])
+        requirements = np.column_stack([np.repeat(np.arange(1, classes + 1), 8),
+                                        rng.integers(1, subjects + 1, 8 * classes), np.full(8 * classes, 4)])
+
+        t0 = time.perf_counter()
+        out = validate_arrays(Tables(assign, qual, class_size, room_capacity, requirements))
+        ms = (time.perf_counter() - t0) * 1000
+        load = "-"
+        if n <= args.db_max:
+            load = f"{load_ms(os.path.join(tmp.name, f'{n}.db'), assign, qual, class_size, room_capacity, requirements):.1f}"
+        c = out["counts"]
+        print(f"{n:>12} {ms:>8.1f} {load:>8} {c['teacher_conflicts']:>8} {c['room_conflicts']:>8}"
+              f" {c['unqualified']:>8} {c['over_capacity']:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+# Load test against a real uvicorn on a synthetic district.
+#
+# Each virtual client behaves like a browser running frontend/app.js: a
+# startup burst of the five reference fetches (in parallel, as app.js does),
+# then a closed loop of
+#   schedule   GET /api/schedule?class_id=...           most requests
+#   override   POST /api/schedule/override              re-saves a cell it just read
+#   generate   POST /api/schedule/generate              rare, full re-solve
+# with an occasional page reload repeating the burst. Reported per endpoint:
+# p50/p95/p99 latency, throughput and error rates; from the server's /metrics:
+# time spent in SQLite write statements and commits (where lock waits land)
+# and "database is locked" failures. Output is JSON, for diffing releases.
+
+REFERENCE = ["/api/classes?fields=id,name", "/api/teachers?fields=id,name", "/api/subjects?fields=id,name",
+             "/api/rooms?fields=id,name,capacity", "/api/timeslots"]
+MIX = "schedule=0.93,override=0.065,generate=0.005"
+
+def build_db(url: str, schools: int) -> Dict[str, int]:
+    # Tables from the synthetic problem, plus a generated live schedule.
+    # Imports are deferred: db.py reads SMART_CLASSROOM_DB when first imported
+    os.environ["SMART_CLASSROOM_DB"] = url
+    import synth
+    from db import Base, SessionLocal, get_engine
+    from models import ClassGroup, Room, Subject, SubjectRequirement, Teacher, TeacherSubject, TimeSlot
+    from scheduler import SolveConfig, generate_schedule
+
+    problem = synth.synthetic_problem(schools)
+    Base.metadata.create_all(get_engine())
+    teacher_ids = sorted({t for ts in problem.qual.values() for t in ts})
+    db = SessionLocal()
+    try:
+        for model, rows in [
+            (Teacher, [{"id": t, "name": f"Teacher {t}"} for t in teacher_ids]),
+            (Subject, [{"id": s, "name": f"Subject {s}"} for s in problem.qual]),
+            (ClassGroup, [{"id": c, "name": f"Class {c}", "size": n} for c, n in problem.class_sizes.items()]),
+            (Room, [{"id": r, "name": f"Room {r}", "capacity": cap} for r, cap in problem.rooms]),
+            (TimeSlot, [{"id": ts, "day": d, "slot": s, "label": f"P{s + 1}"} for ts, d, s in problem.timeslots]),
+            (TeacherSubject, [{"teacher_id": t, "subject_id": s} for s, ts in problem.qual.items() for t in ts]),
+            (SubjectRequirement, [{"class_id": c, "subject_id": s, "periods_per_week": n, "block_length": b}
+                                  for c, s, n, b in problem.requirements]),
+        ]:
+            db.execute(model.__table__.insert(), rows)
+        db.commit()
+        stats = generate_schedule(db, SolveConfig(), name="loadtest")
+    finally:
+        db.close()
+    return {"classes": len(problem.class_sizes), "teachers": len(teacher_ids),
+            "rooms": len(problem.rooms), "assignments": stats["placed"]}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(url: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, SMART_CLASSROOM_DB=url)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                            cwd=BACKEND, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/timeslots", timeout=1).status_code == 200:
+                return proc
+        except httpx.TransportError:
+            pass
+        if proc.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("uvicorn did not become ready within 30s")
+
+def scrape(client: httpx.Client) -> Dict[str, float]:
+    # the _sum/_count series and counters we report, keyed by their full name
+    text = client.get("/metrics").text
+    out = {}
+    for line in text.splitlines():
+        m = re.match(r'(db_statement_seconds_(?:sum|count)\{op="\w+"\}|db_commit_seconds_(?:sum|count)'
+                     r'|db_locked_total) (\S+)$', line)
+        if m:
+            out[m.group(1)] = float(m.group(2))
+    return out
+
+class Recorder:
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, path: str, **kw):
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, path, **kw)
+            code = str(r.status_code)
+        except httpx.HTTPError as e:
+            r, code = None, type(e).__name__
+        self.latency[name].append(time.perf_counter() - t0)
+        self.status[name][code] += 1
+        return r
+
+    def report(self, seconds: float) -> Dict[str, dict]:
+        out = {}
+        for name in sorted(self.latency):
+            ms = np.array(self.latency[name]) * 1000
+            codes = dict(self.status[name])
+            n = len(ms)
+            errors = sum(v for k, v in codes.items() if not k.isdigit() or k.startswith("5"))
+            rejected = sum(v for k, v in codes.items() if k.startswith("4"))
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            out[name] = {"requests": n, "rps": round(n / seconds, 1),
+                         "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+                         "max_ms": round(ms.max(), 1), "error_rate": round(errors / n, 4),
+                         "rejected_rate": round(rejected / n, 4), "status": codes}
+        return out
+
+async def client_loop(rec: Recorder, client: httpx.AsyncClient, rng: random.Random,
+                      mix: Dict[str, float], reload: float, stop: float) -> None:
+    classes: List[int] = []
+
+    async def startup():
+        nonlocal classes
+        rs = await asyncio.gather(*(rec.call(client, "reference", "GET", p) for p in REFERENCE))
+        if rs[0] is not None and rs[0].status_code == 200:
+            classes = [c["id"] for c in rs[0].json()]
+
+    await startup()
+    cell = None
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < stop and classes:
+        kind = rng.choices(names, weights)[0]
+        if rng.random() < reload:
+            await startup()
+        elif kind == "override" and cell is not None:
+            await rec.call(client, "override", "POST", "/api/schedule/override", json=cell)
+        elif kind == "generate":
+            await rec.call(client, "generate", "POST", "/api/schedule/generate")
+        else:
+            class_id = rng.choice(classes)
+            r = await rec.call(client, "schedule", "GET", "/api/schedule", params={"class_id": class_id})
+            if r is not None and r.status_code == 200:
+                grid = r.json().get(str(class_id), {})
+                if grid:
+                    slot_key, a = rng.choice(sorted(grid.items()))
+                    day, slot = map(int, slot_key.split(","))
+                    cell = {"class_id": class_id, "day": day, "slot": slot, "subject_id": a["subject_id"],
+                            "teacher_id": a["teacher_id"], "room_id": a["room_id"]}
+
+def _parse_mix(spec: str) -> Dict[str, float]:
+    mix = {k: float(v) for k, v in (part.split("=") for part in spec.split(","))}
+    unknown = set(mix) - {"schedule", "override", "generate"}
+    if unknown:
+        raise SystemExit(f"unknown request kinds in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+async def run(base: str, clients: int, seconds: float, mix: Dict[str, float], reload: float,
+              seed: int) -> Dict[str, object]:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+        t0 = time.monotonic()
+        stop = t0 + seconds
+        await asyncio.gather(*(client_loop(rec, client, random.Random(seed + i), mix, reload, stop)
+                               for i in range(clients)))
+        elapsed = time.monotonic() - t0
+    total = sum(len(v) for v in rec.latency.values())
+    return {"seconds": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 1),
+            "endpoints": rec.report(elapsed)}
+
+def sqlite_report(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    d = {k: after.get(k, 0.0) - before.get(k, 0.0) for k in after}
+
+    def mean_ms(prefix):
+        n = d.get(prefix.replace("_sum", "_count"), 0)
+        return round(d.get(prefix, 0) / n * 1000, 3) if n else 0.0
+
+    return {
+        "write_statements": int(d.get('db_statement_seconds_count{op="write"}', 0)),
+        "write_statement_s": round(d.get('db_statement_seconds_sum{op="write"}', 0), 3),
+        "write_statement_mean_ms": mean_ms('db_statement_seconds_sum{op="write"}'),
+        "read_statement_mean_ms": mean_ms('db_statement_seconds_sum{op="read"}'),
+        "commits": int(d.get("db_commit_seconds_count", 0)),
+        "commit_s": round(d.get("db_commit_seconds_sum", 0), 3),
+        "commit_mean_ms": mean_ms("db_commit_seconds_sum"),
+        "locked_errors": int(d.get("db_locked_total", 0)),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test the API on a synthetic database under uvicorn")
+    ap.add_argument("--schools", type=int, default=10, help="synthetic district size (20 classes per school)")
+    ap.add_argument("--clients", type=int, default=20, help="concurrent virtual clients")
+    ap.add_argument("--seconds", type=float, default=30)
+    ap.add_argument("--mix", default=MIX, help="request weights after the startup burst")
+    ap.add_argument("--reload", type=float, default=0.01, help="chance per request of a page reload burst")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--db", help="reuse this SQLite file instead of building a fresh one")
+    ap.add_argument("--out", help="also write the JSON report here")
+    args = ap.parse_args()
+    mix = _parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.abspath(args.db) if args.db else os.path.join(tmp, "load.db")
+        url = f"sqlite:///{path}"
+        dataset = None
+        if not args.db:
+            t0 = time.perf_counter()
+            dataset = build_db(url, args.schools)
+            dataset["build_s"] = round(time.perf_counter() - t0, 2)
+        port = _free_port()
+        server = start_server(url, port, args.workers)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            with httpx.Client(base_url=base) as c:
+                before = scrape(c)
+                result = asyncio.run(run(base, args.clients, args.seconds, mix, args.reload, args.seed))
+                after = scrape(c)
+        finally:
+            server.terminate()
+            server.wait()
+
+    # with several workers /metrics is one worker's view, so the SQLite
+    # figures cover only that process
+    report = {"config": {"schools": args.schools, "clients": args.clients, "seconds": args.seconds,
+                         "mix": mix, "reload": args.reload, "workers": args.workers, "seed": args.seed},
+              "dataset": dataset, **result, "sqlite": sqlite_report(before, after)}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from __future__ import annotations
+import os
+import random
+import sys
+
+# Benchmarks run from the project root; the backend modules import each other flat
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from problem import Problem  # noqa: E402
+
+DAYS = 5
+SLOTS = 8
+
+def synthetic_problem(schools: int, classes_per_school: int = 20, seed: int = 0) -> Problem:
+    # A district of independent-ish schools: each school has its own teachers
+    # and subject offerings, all rooms are shared across the district
+    rng = random.Random(seed)
+    timeslots = [(d * SLOTS + s + 1, d, s) for d in range(DAYS) for s in range(SLOTS)]
+    class_sizes, rooms, qual, reqs = {}, [], {}, []
+    c_id = t_id = s_id = r_id = 0
+    for _ in range(schools):
+        subjects = []
+        for _ in range(6):
+            s_id += 1
+            subjects.append(s_id)
+            qual[s_id] = []
+        for _ in range(classes_per_school):
+            t_id += 1
+            for s in rng.sample(subjects, 2):
+                qual[s].append(t_id)
+        for _ in range(classes_per_school):
+            r_id += 1
+            rooms.append((r_id, rng.choice([30, 32, 40])))
+        for _ in range(classes_per_school):
+            c_id += 1
+            class_sizes[c_id] = rng.randint(24, 32)
+            for i, s in enumerate(subjects):
+                reqs.append((c_id, s, 5 if i < 4 else 4, 2 if i == 4 else 1))
+    rooms.sort(key=lambda r: r[1])
+    return Problem(class_sizes, rooms, timeslots, qual, reqs)
@@ -4,6 +4,7 @@ const state = {
   classes: [], teachers: [], subjects: [], rooms: [], timeslots: [],
   schedule: {},
   currentClassId: null,
+  events: null,
 };
 
 function colorFor(text){
@@ -25,7 +26,8 @@ async function api(path, opts={}){
 
 async function loadAll(){
   const [classes, teachers, subjects, rooms, timeslots] = await Promise.all([
-    api('/api/classes'), api('/api/teachers'), api('/api/subjects'), api('/api/rooms'), api('/api/timeslots')
+    api('/api/classes?fields=id,name'), api('/api/teachers?fields=id,name'), api('/api/subjects?fields=id,name'),
+    api('/api/rooms?fields=id,name,capacity'), api('/api/timeslots')
   ]);
   state.classes = classes; state.teachers = teachers; state.subjects = subjects; state.rooms = rooms; state.timeslots = timeslots;
   state.currentClassId = classes[0]?.id || null;
@@ -34,6 +36,7 @@ async function loadAll(){
   await reloadSchedule();
   drawGrid();
   bindControls();
+  subscribeEvents();
 }
 
 async function reloadSchedule(){
@@ -41,6 +44,48 @@ async function reloadSchedule(){
   state.schedule = data;
 }
 
+// Live updates: the server pushes changed cells for the class we're viewing,
+// so the grid is patched in place instead of refetching the whole schedule.
+// A stream only carries changes made through the worker serving it, so after
+// our own writes (which another worker may have handled) we always refetch.
+function subscribeEvents(){
+  if(!window.EventSource) return;
+  if(state.events) state.events.close();
+  const es = new EventSource('/api/schedule/events?class_id=' + state.currentClassId);
+  es.addEventListener('cells', (e)=> applyCells(JSON.parse(e.data).cells));
+  es.addEventListener('resync', async ()=>{
+    await reloadSchedule();
+    drawGrid();
+  });
+  state.events = es;
+}
+
+function nameOf(list, id){
+  return (list.find(x=>x.id===id)||{}).name || '';
+}
+
+function applyCells(cells){
+  for(const [classId, day, slot, subjectId, teacherId, roomId] of cells){
+    const key = `${day},${slot}`;
+    const grid = state.schedule[classId] = state.schedule[classId] || {};
+    if(subjectId === null){
+      delete grid[key];
+    }else{
+      const ts = state.timeslots.find(t=>t.day===day && t.slot===slot);
+      grid[key] = {
+        subject_id: subjectId, subject: nameOf(state.subjects, subjectId),
+        teacher_id: teacherId, teacher: nameOf(state.teachers, teacherId),
+        room_id: roomId, room: nameOf(state.rooms, roomId),
+        label: ts ? ts.label : ''
+      };
+    }
+    if(classId === state.currentClassId){
+      const el = document.querySelector(`#grid [data-key="${key}"]`);
+      if(el) fillCell(el, grid[key]);
+    }
+  }
+}
+
 function refreshRoster(){
   const t = document.getElementById('teacher-list');
   const s = document.getElementById('subject-list');
@@ -56,6 +101,7 @@ function refreshRoster(){
     state.currentClassId = parseInt(e.target.value,10);
     await reloadSchedule();
     drawGrid();
+    subscribeEvents();
   };
 }
 
@@ -81,18 +127,11 @@ function drawGrid(){
     for(let s=0; s<labelsByDay[d].length; s++){
       const tsObj = state.timeslots.find(t=>t.day===d && t.slot===s);
       const key = `${d},${s}`;
-      const entry = (state.schedule[state.currentClassId]||{})[[d,s]];
+      const entry = (state.schedule[state.currentClassId]||{})[key];
       const c = document.createElement('div');
       c.className = 'cell';
-      if(entry){
-        c.style.background = colorFor(entry.subject);
-        c.innerHTML = `
-          <div class="subject">${entry.subject}</div>
-          <div class="meta">${entry.teacher} • ${entry.room}</div>
-        `;
-      }else{
-        c.innerHTML = `<div class="meta">—</div>`;
-      }
+      c.dataset.key = key;
+      fillCell(c, entry);
       c.onclick = ()=> openOverride(d, s, tsObj.label);
       grid.appendChild(c);
     }
@@ -101,6 +140,19 @@ function drawGrid(){
   document.getElementById('grid-title').textContent = `Weekly Grid — ${state.classes.find(c=>c.id===state.currentClassId)?.name||''}`;
 }
 
+function fillCell(c, entry){
+  if(entry){
+    c.style.background = colorFor(entry.subject);
+    c.innerHTML = `
+      <div class="subject">${entry.subject}</div>
+      <div class="meta">${entry.teacher} • ${entry.room}</div>
+    `;
+  }else{
+    c.style.background = '';
+    c.innerHTML = `<div class="meta">—</div>`;
+  }
+}
+
 function cell(text, cls){
   const c = document.createElement('div');
   c.className = 'cell ' + (cls||'');
@@ -111,14 +163,12 @@ function cell(text, cls){
 function bindControls(){
   document.getElementById('btn-generate').onclick = async ()=>{
     const res = await api('/api/schedule/generate', {method:'POST'});
-    await reloadSchedule();
-    drawGrid();
+    await reloadSchedule(); drawGrid();
     alert(`Placed ${res.stats.placed} of ${res.stats.needed} required periods.`);
   };
   document.getElementById('btn-clear').onclick = async ()=>{
     await api('/api/schedule/clear', {method:'POST'});
-    await reloadSchedule();
-    drawGrid();
+    await reloadSchedule(); drawGrid();
   };
 }
 
@@ -154,8 +204,7 @@ function openOverride(day, slot, label){
         })
       });
       dlg.close();
-      await reloadSchedule();
-      drawGrid();
+      await reloadSchedule(); drawGrid();
     }catch(err){
       alert('Could not override: ' + err.message);
     }
@@ -0,0 +1,23 @@
+from __future__ import annotations
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The backend modules import each other flat, and db.py reads
+# SMART_CLASSROOM_DB when first imported: point it at a throwaway file
+# before any test module imports the app.
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND)
+_tmp = tempfile.mkdtemp(prefix="smart-classroom-tests-")
+os.environ["SMART_CLASSROOM_DB"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["SMART_CLASSROOM_EXPORT_CACHE"] = os.path.join(_tmp, "export_cache")
+
+@pytest.fixture(scope="session")
+def client():
+    import seed
+    from fastapi.testclient import TestClient
+    import app
+    seed.run()  # the demo institution
+    return TestClient(app.app)
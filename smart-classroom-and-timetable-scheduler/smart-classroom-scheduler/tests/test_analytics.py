@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from sqlalchemy import text
+
+import analytics
+from db import SessionLocal
+
+def _room(client, room_id: int) -> dict:
+    r = client.get("/api/analytics/rooms")
+    assert r.status_code == 200
+    return next(room for room in r.json()["rooms"] if room["room_id"] == room_id)
+
+def test_analytics_follow_reference_edits(client):
+    assert client.post("/api/schedule/generate").status_code == 200
+    room = _room(client, 1)
+    assert _room(client, 1) == room  # served from the cache
+    db = SessionLocal()
+    try:
+        # any writer, not only the ORM, invalidates the cached summary
+        db.execute(text("UPDATE rooms SET capacity = capacity + 5, name = 'Renamed' WHERE id = 1"))
+        db.commit()
+    finally:
+        db.close()
+    edited = _room(client, 1)
+    assert (edited["capacity"], edited["name"]) == (room["capacity"] + 5, "Renamed")
+    assert len(analytics._cache) >= 2
@@ -0,0 +1,16 @@
+from __future__ import annotations
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from decompose import solve_decomposed
+from scheduler import SolveConfig
+from synth import synthetic_problem
+
+def test_decomposed_result_does_not_depend_on_workers():
+    problem = synthetic_problem(schools=6, classes_per_school=5)
+    one, _ = solve_decomposed(problem, SolveConfig(decompose=True, workers=1))
+    two, stats = solve_decomposed(problem, SolveConfig(decompose=True, workers=2))
+    assert stats["workers"] == 2 and stats["parts"] > 1
+    assert one == two
@@ -0,0 +1,43 @@
+from __future__ import annotations
+from datetime import date
+
+import export
+
+def test_export_streams_one_snapshot(client, monkeypatch):
+    assert client.post("/api/schedule/generate").status_code == 200
+    monkeypatch.setattr(export, "BATCH", 1)
+    conn, version_id = export.snapshot()
+    # changes committed after the version was read, before or while the
+    # cells are streamed, do not reach the export
+    assert client.post("/api/schedule/clear").status_code == 200
+    body = export.stream(conn, version_id, "csv", "class", None, date(2024, 1, 1))
+    first = next(body)
+    assert client.post("/api/schedule/generate").status_code == 200
+    assert client.post("/api/schedule/clear").status_code == 200
+    rows = (first + b"".join(body)).decode().splitlines()
+    placed = client.post("/api/schedule/generate").json()["stats"]["placed"]
+    assert len(rows) == 1 + placed
+    assert export.cache_path(version_id, "csv", "class", None, date(2024, 1, 1)).exists()
+
+def test_concurrent_streams_of_one_export(client):
+    assert client.post("/api/schedule/generate").status_code == 200
+    a = export.stream(*export.snapshot(), "html", "teacher", None, date(2024, 1, 1))
+    conn, version_id = export.snapshot()
+    b = export.stream(conn, version_id, "html", "teacher", None, date(2024, 1, 1))
+    out_a, out_b = next(a), next(b)
+    out_a += b"".join(a)
+    out_b += b"".join(b)
+    assert out_a == out_b
+    assert export.cache_path(version_id, "html", "teacher", None, date(2024, 1, 1)).read_bytes() == out_a
+
+def test_export_endpoint_serves_and_evicts_the_cache(client, monkeypatch):
+    monkeypatch.setattr(export, "CACHE_ENTRIES", 2)
+    for by in ("class", "teacher", "class"):
+        r = client.get(f"/api/export/schedule.csv?by={by}&id=1")
+        assert r.status_code == 200
+        assert client.get(f"/api/export/schedule.csv?by={by}&id=1").content == r.content
+        etag = r.headers["etag"]
+        assert client.get(f"/api/export/schedule.csv?by={by}&id=1",
+                          headers={"If-None-Match": etag}).status_code == 304
+    client.get("/api/export/schedule.ics")
+    assert len([p for p in export.CACHE_DIR.iterdir() if not p.name.startswith(".")]) == 2
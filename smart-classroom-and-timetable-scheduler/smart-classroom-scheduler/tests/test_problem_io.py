@@ -0,0 +1,38 @@
+from __future__ import annotations
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+import problem_io
+from synth import synthetic_problem
+
+def test_problem_round_trip(tmp_path):
+    problem = synthetic_problem(schools=2, classes_per_school=4)
+    problem_io.save_problem(tmp_path / "p.sctp", problem)
+    loaded = problem_io.load_problem_file(tmp_path / "p.sctp")
+    assert problem_io.problem_arrays(loaded).keys() == problem_io.problem_arrays(problem).keys()
+    for name, a in problem_io.problem_arrays(problem).items():
+        assert np.array_equal(problem_io.problem_arrays(loaded)[name], a)
+
+def test_version_1_files_still_load(tmp_path, monkeypatch):
+    arrays = problem_io.problem_arrays(synthetic_problem(schools=1, classes_per_school=3))
+    del arrays["conflicts"]
+    monkeypatch.setattr(problem_io, "FORMAT_VERSION", 1)
+    problem_io.write_arrays(tmp_path / "v1.sctp", "problem", arrays)
+    monkeypatch.undo()
+    assert problem_io.load_problem_file(tmp_path / "v1.sctp").conflicts == {}
+
+def test_newer_versions_and_unknown_arrays_are_rejected(tmp_path, monkeypatch):
+    arrays = problem_io.problem_arrays(synthetic_problem(schools=1, classes_per_school=3))
+    problem_io.write_arrays(tmp_path / "extra.sctp", "problem", {**arrays, "rooms_features": arrays["room_ids"]})
+    with pytest.raises(ValueError, match="unknown problem arrays: rooms_features"):
+        problem_io.load_problem_file(tmp_path / "extra.sctp")
+    monkeypatch.setattr(problem_io, "FORMAT_VERSION", problem_io.FORMAT_VERSION + 1)
+    problem_io.write_arrays(tmp_path / "next.sctp", "problem", arrays)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match="format version"):
+        problem_io.load_problem_file(tmp_path / "next.sctp")
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import scheduler
+import versions
+from db import SessionLocal
+from models import Assignment, ScheduleVersion
+
+def _etag(client) -> int:
+    return int(client.get("/api/schedule").headers["etag"].strip('"'))
+
+def _count(model) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(model).count()
+    finally:
+        db.close()
+
+def test_generate_returns_the_revision_it_wrote(client):
+    r = client.post("/api/schedule/generate")
+    assert r.status_code == 200
+    assert r.json()["revision"] == r.json()["stats"]["revision"] == _etag(client)
+    # usable as the next If-Match
+    r = client.post("/api/schedule/clear", headers={"If-Match": f'"{r.json()["revision"]}"'})
+    assert r.status_code == 200
+    assert r.json()["revision"] == _etag(client)
+
+def test_stale_if_match_is_rejected(client):
+    current = _etag(client)
+    r = client.post("/api/schedule/clear", headers={"If-Match": f'"{current - 1}"'})
+    assert r.status_code == 412
+    assert _etag(client) == current
+
+def test_clear_during_generate_fails_and_keeps_the_clear(client, monkeypatch):
+    assert client.post("/api/schedule/generate").status_code == 200
+    solve = scheduler.solve
+
+    def solve_then_clear(problem, config):
+        out = solve(problem, config)
+        assert client.post("/api/schedule/clear").status_code == 200
+        return out
+
+    monkeypatch.setattr(scheduler, "solve", solve_then_clear)
+    versions_before = _count(ScheduleVersion)
+    r = client.post("/api/schedule/generate")
+
+    assert r.status_code == 409
+    assert r.json()["revision"] == _etag(client)
+    # the clear stands, nothing of the generate was merged into it
+    assert client.get("/api/schedule").json() == {}
+    assert _count(Assignment) == 0
+    # only the clear's version was kept; the staged generate was deleted
+    assert _count(ScheduleVersion) == versions_before + 1
+
+def test_generate_after_the_race_succeeds(client):
+    r = client.post("/api/schedule/generate")
+    assert r.status_code == 200
+    assert _count(Assignment) == r.json()["stats"]["placed"] > 0
+    db = SessionLocal()
+    try:
+        assert r.json()["revision"] == versions.revision(db)
+    finally:
+        db.close()
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from db import SessionLocal
+from models import Teacher
+
+def test_whatif_solves_in_the_pool(client):
+    r = client.post("/api/whatif", json={"scenarios": [{"name": "more room", "add_rooms": [40]}, {}]})
+    assert r.status_code == 200
+    assert [s["placed"] > 0 for s in r.json()["scenarios"]] == [True, True]
+
+def test_whatif_teacher_ids_are_checked_against_the_database(client):
+    db = SessionLocal()
+    try:
+        idle = Teacher(name="Unqualified Teacher")  # teaches nothing yet
+        db.add(idle)
+        db.commit()
+        idle_id = idle.id
+    finally:
+        db.close()
+    assert client.post("/api/whatif", json={"scenarios": [{"remove_teachers": [idle_id]}]}).status_code == 200
+    r = client.post("/api/whatif", json={"scenarios": [{"remove_teachers": [idle_id + 1000]}]})
+    assert r.status_code == 400
+    assert "unknown teachers" in r.json()["detail"]